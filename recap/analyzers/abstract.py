@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from pathlib import PurePosixPath
-from typing import Any, Generator
+from typing import Any, Generator, List
 
 
 class AbstractAnalyzer(ABC):
@@ -23,6 +23,55 @@ class AbstractAnalyzer(ABC):
 
         raise NotImplementedError
 
+    produces: List[str] = []
+    """
+    Metadata types that `analyze` returns, like `columns`. Used to wire up
+    analyzers that consume them.
+    """
+
+    consumes: List[str] = []
+    """
+    Metadata types this analyzer uses from other analyzers. The crawler runs
+    the analyzers that produce them first, and passes their results to
+    `analyze_with`. Analyzers that don't depend on each other may run
+    concurrently.
+    """
+
+    incremental: bool = False
+    """
+    Set to True if the analyzer updates its previous metadata in
+    `analyze_with`. The crawler then passes in the metadata the catalog
+    already has for each path.
+    """
+
+    reads_data: bool = False
+    """
+    Set to True if the analyzer's metadata depends on a path's data, not just
+    its schema. Incremental crawls run these analyzers even on unchanged
+    paths if the browser's fingerprint doesn't track data changes.
+    """
+
+    def analyze_with(
+        self,
+        path: PurePosixPath,
+        upstream: dict[str, Any],
+        previous: dict[str, Any],
+    ) -> dict[str, Any]:
+        """
+        Analyze a path, given metadata from other sources. The crawler calls
+        this rather than `analyze`. Analyzers that use upstream or previous
+        metadata override it; by default, it just calls `analyze`.
+
+        :param upstream: Metadata from this crawl's analyzers that produce
+            the types in `consumes`. Types that weren't produced are missing.
+        :param previous: The path's metadata from the catalog, if
+            `incremental` is set. Empty if the path hasn't been crawled
+            before.
+        :returns: Metadata dictionary of the format {"metadata_type": Any}.
+        """
+
+        return self.analyze(path)
+
     @staticmethod
     @contextmanager
     @abstractmethod
@@ -1,22 +1,260 @@
+import decimal
+import fnmatch
+import importlib.util
+import json
 import logging
 import sqlalchemy as sa
+import sqlite3
+import time
 from .abstract import AbstractAnalyzer
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import PurePosixPath
-from recap.browsers.db import DatabasePath, DatabaseBrowser
+from recap.browsers.db import (
+    BoundedCache,
+    DatabaseBrowser,
+    DatabasePath,
+    GrantCache,
+    ReflectionCache,
+)
+from recap.engines import create_engine, engine_state
 from typing import Any, Generator, List
 
 
 log = logging.getLogger(__name__)
 
 
+# Default maximum number of schemas to keep database statistics for.
+DEFAULT_STATISTICS_CACHE_SCHEMAS = 4
+
+
+class DatabaseStatistics:
+    """
+    Reads the table and column statistics that a database keeps for its query
+    planner: `pg_class` and `pg_stats` in PostgreSQL,
+    `information_schema.tables` (and column histograms) in MySQL,
+    `sqlite_stat1` in SQLite, and `information_schema.tables` in Snowflake.
+
+    Statistics are read for a whole schema at once, in a query or two, and
+    cached per engine, so the rest of the schema's tables are served from
+    memory. Statistics are estimates, and only as fresh as the database's
+    last `ANALYZE` (or equivalent).
+    """
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        max_schemas: int = DEFAULT_STATISTICS_CACHE_SCHEMAS,
+    ):
+        self.engine = engine
+        self.reflection = ReflectionCache.for_engine(engine)
+        self.schemas = BoundedCache(max_schemas)
+
+    def get(self, schema: str, table: str) -> dict[str, Any]:
+        """
+        :returns: A dictionary with the table's estimated `rows` (if known),
+            and `columns`, a dictionary of per-column statistics such as
+            `null_fraction`, `distinct`, and `histogram`. Either can be
+            missing if the database doesn't have statistics for the table.
+        """
+
+        tables = self._get_schema(schema)
+        return tables.get(table) or tables.get(table.lower()) or {}
+
+    def _get_schema(self, schema: str) -> dict[str, dict[str, Any]]:
+        # Only one thread loads a schema; the others wait and use its results.
+        return self.schemas.get_or_load(
+            schema,
+            lambda: self._load_schema(schema),
+        )
+
+    def _load_schema(self, schema: str) -> dict[str, dict[str, Any]]:
+        tables = {}
+        loader = getattr(self, f"_load_{self.engine.dialect.name}", None)
+        if loader:
+            try:
+                with self.engine.connect() as conn:
+                    tables = loader(conn, schema)
+            except Exception as e:
+                log.debug(
+                    'Unable to read statistics for schema=%s',
+                    schema,
+                    exc_info=e,
+                )
+        return tables
+
+    def _load_postgresql(
+        self,
+        conn: sa.engine.Connection,
+        schema: str,
+    ) -> dict[str, dict[str, Any]]:
+        tables = {}
+        rows = conn.execute(sa.text("""
+            SELECT c.relname, c.reltuples
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'm', 'f')
+        """), {'schema': schema})
+        for table, reltuples in rows:
+            # reltuples is -1 for tables that have never been analyzed.
+            tables[table] = {
+                'rows': int(reltuples) if reltuples >= 0 else None,
+                'columns': {},
+            }
+        rows = conn.execute(sa.text("""
+            SELECT
+                tablename,
+                attname,
+                null_frac,
+                n_distinct,
+                histogram_bounds::text::text[]
+            FROM pg_stats
+            WHERE schemaname = :schema
+        """), {'schema': schema})
+        for table, column, null_frac, n_distinct, histogram in rows:
+            table_stats = tables.setdefault(table, {'rows': None, 'columns': {}})
+            column_stats: dict[str, Any] = {'null_fraction': null_frac}
+            # Negative n_distinct is a fraction of the row count.
+            if n_distinct is not None and n_distinct >= 0:
+                column_stats['distinct'] = int(n_distinct)
+            elif n_distinct is not None and table_stats['rows'] is not None:
+                column_stats['distinct'] = round(
+                    -n_distinct * table_stats['rows'],
+                )
+            if histogram:
+                column_stats['histogram'] = histogram
+            table_stats['columns'][column] = column_stats
+        return tables
+
+    def _load_mysql(
+        self,
+        conn: sa.engine.Connection,
+        schema: str,
+    ) -> dict[str, dict[str, Any]]:
+        tables = {}
+        rows = conn.execute(sa.text("""
+            SELECT table_name, table_rows
+            FROM information_schema.tables
+            WHERE table_schema = :schema
+        """), {'schema': schema})
+        for table, table_rows in rows:
+            tables[table] = {
+                'rows': int(table_rows) if table_rows is not None else None,
+                'columns': {},
+            }
+        # Index cardinality is an estimate of a leading column's distinct count.
+        rows = conn.execute(sa.text("""
+            SELECT table_name, column_name, MAX(cardinality)
+            FROM information_schema.statistics
+            WHERE table_schema = :schema AND seq_in_index = 1
+            GROUP BY table_name, column_name
+        """), {'schema': schema})
+        for table, column, cardinality in rows:
+            if cardinality is not None and table in tables:
+                tables[table]['columns'][column] = {
+                    'distinct': int(cardinality),
+                }
+        try:
+            # Histograms only exist in MySQL 8+, and only after running
+            # ANALYZE TABLE ... UPDATE HISTOGRAM.
+            rows = conn.execute(sa.text("""
+                SELECT table_name, column_name, histogram
+                FROM information_schema.column_statistics
+                WHERE schema_name = :schema
+            """), {'schema': schema})
+            for table, column, histogram in rows:
+                if table not in tables:
+                    continue
+                if isinstance(histogram, str):
+                    histogram = json.loads(histogram)
+                column_stats = tables[table]['columns'].setdefault(column, {})
+                column_stats['null_fraction'] = histogram.get('null-values')
+                column_stats['histogram'] = histogram.get('buckets')
+        except Exception as e:
+            log.debug(
+                'Unable to read column histograms for schema=%s',
+                schema,
+                exc_info=e,
+            )
+        return tables
+
+    def _load_sqlite(
+        self,
+        conn: sa.engine.Connection,
+        schema: str,
+    ) -> dict[str, dict[str, Any]]:
+        tables = {}
+        # sqlite_stat1 only exists after ANALYZE has been run. Each row's stat
+        # starts with the table's row count, followed (for indexes) by the
+        # average number of rows per distinct value of each index prefix.
+        quoted_schema = schema.replace('"', '""')
+        rows = conn.execute(sa.text(
+            f'SELECT tbl, idx, stat FROM "{quoted_schema}".sqlite_stat1'
+        ))
+        for table, index, stat in rows:
+            values = [int(value) for value in stat.split() if value.isdigit()]
+            if not values:
+                continue
+            table_stats = tables.setdefault(table, {
+                'rows': values[0],
+                'columns': {},
+            })
+            if not index or len(values) < 2 or not values[1]:
+                continue
+            index_columns = next((
+                index_dict.get('column_names', [])
+                for index_dict in self.reflection.get(
+                    'get_indexes',
+                    table,
+                    schema,
+                )
+                if index_dict['name'] == index
+            ), None)
+            if index_columns and index_columns[0]:
+                table_stats['columns'][index_columns[0]] = {
+                    'distinct': round(values[0] / values[1]),
+                }
+        return tables
+
+    def _load_snowflake(
+        self,
+        conn: sa.engine.Connection,
+        schema: str,
+    ) -> dict[str, dict[str, Any]]:
+        tables = {}
+        rows = conn.execute(sa.text("""
+            SELECT table_name, row_count
+            FROM information_schema.tables
+            WHERE LOWER(table_schema) = LOWER(:schema)
+        """), {'schema': schema})
+        for table, row_count in rows:
+            # Snowflake stores unquoted identifiers in upper case, but
+            # SQLAlchemy reflects them in lower case.
+            tables[table.lower()] = {
+                'rows': int(row_count) if row_count is not None else None,
+                'columns': {},
+            }
+        return tables
+
+    @classmethod
+    def for_engine(cls, engine: sa.engine.Engine) -> 'DatabaseStatistics':
+        """
+        :returns: The DatabaseStatistics for an engine. Statistics live as
+            long as the engine does.
+        """
+
+        return engine_state(engine, 'statistics', lambda: cls(engine))
+
+
 class AbstractDatabaseAnalyzer(AbstractAnalyzer):
     def __init__(
         self,
         engine: sa.engine.Engine,
     ):
         self.engine = engine
+        # Shared by all analyzers that use the same engine.
+        self.reflection = ReflectionCache.for_engine(engine)
 
     def analyze(self, path: PurePosixPath) -> dict[str, Any]:
         database_path = DatabasePath(path)
@@ -41,11 +279,16 @@ class AbstractDatabaseAnalyzer(AbstractAnalyzer):
     def open(cls, **config) -> Generator['AbstractDatabaseAnalyzer', None, None]:
         assert 'url' in config, \
             f"Config for {cls.__name__} is missing `url` config."
-        engine = sa.create_engine(config['url'])
+        engine = create_engine(
+            config['url'],
+            **config.get('engine', {}),
+        )
         yield cls(engine)
 
 
 class TableLocationAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['location']
+
     def __init__(
         self,
         root: PurePosixPath,
@@ -79,12 +322,17 @@ class TableLocationAnalyzer(AbstractDatabaseAnalyzer):
     def open(cls, **config) -> Generator['TableLocationAnalyzer', None, None]:
         assert 'url' in config, \
             f"Config for {cls.__name__} is missing `url` config."
-        engine = sa.create_engine(config['url'])
+        engine = create_engine(
+            config['url'],
+            **config.get('engine', {}),
+        )
         root = DatabaseBrowser.root(**config)
         yield TableLocationAnalyzer(root, engine)
 
 
 class TableColumnAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['columns']
+
     def analyze_table(
         self,
         schema: str,
@@ -92,10 +340,12 @@ class TableColumnAnalyzer(AbstractDatabaseAnalyzer):
         is_view: bool = False
     ) -> dict[str, Any]:
         results = {}
-        columns = sa.inspect(self.engine).get_columns(table, schema)
+        columns = self.reflection.get('get_columns', table, schema)
         for column in columns:
+            # Reflection results are cached and shared, so don't modify them.
+            column = dict(column)
             if column.get('comment', None) is None:
-                del column['comment']
+                column.pop('comment', None)
             try:
                 generic_type = column['type'].as_generic()
                 # Strip length/precision to make generic strings more generic.
@@ -123,6 +373,8 @@ class TableColumnAnalyzer(AbstractDatabaseAnalyzer):
 
 
 class TableIndexAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['indexes']
+
     def analyze_table(
         self,
         schema: str,
@@ -130,7 +382,7 @@ class TableIndexAnalyzer(AbstractDatabaseAnalyzer):
         is_view: bool = False
     ) -> dict[str, Any]:
         indexes = {}
-        index_dicts = sa.inspect(self.engine).get_indexes(table, schema)
+        index_dicts = self.reflection.get('get_indexes', table, schema)
         for index_dict in index_dicts:
             indexes[index_dict['name']] = {
                 'columns': index_dict.get('column_names', []),
@@ -140,28 +392,34 @@ class TableIndexAnalyzer(AbstractDatabaseAnalyzer):
 
 
 class TablePrimaryKeyAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['primary_key']
+
     def analyze_table(
         self,
         schema: str,
         table: str,
         is_view: bool = False
     ) -> dict[str, Any]:
-        pk_dict = sa.inspect(self.engine).get_pk_constraint(table, schema)
+        pk_dict = self.reflection.get('get_pk_constraint', table, schema)
         return {'primary_key': pk_dict} if pk_dict else {}
 
 
 class TableForeignKeyAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['foreign_keys']
+
     def analyze_table(
         self,
         schema: str,
         table: str,
         is_view: bool = False
     ) -> dict[str, Any]:
-        fk_dict = sa.inspect(self.engine).get_foreign_keys(table, schema)
+        fk_dict = self.reflection.get('get_foreign_keys', table, schema)
         return {'foreign_keys': fk_dict} if fk_dict else {}
 
 
 class TableViewDefinitionAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['view_definition']
+
     def analyze_table(
         self,
         schema: str,
@@ -174,11 +432,17 @@ class TableViewDefinitionAnalyzer(AbstractDatabaseAnalyzer):
         # https://github.com/googleapis/python-bigquery-sqlalchemy/issues/539
         if self.engine.dialect.name == 'bigquery':
             table = f"{schema}.{table}"
-        def_dict = sa.inspect(self.engine).get_view_definition(table, schema)
+        def_dict = self.reflection.get(
+            'get_view_definition',
+            table,
+            schema,
+        )
         return {'view_definition': def_dict} if def_dict else {}
 
 
 class TableCommentAnalyzer(AbstractDatabaseAnalyzer):
+    produces = ['comment']
+
     def analyze_table(
         self,
         schema: str,
@@ -186,7 +450,11 @@ class TableCommentAnalyzer(AbstractDatabaseAnalyzer):
         is_view: bool = False
     ) -> dict[str, Any]:
         try:
-            comment = sa.inspect(self.engine).get_table_comment(table, schema)
+            comment = self.reflection.get(
+                'get_table_comment',
+                table,
+                schema,
+            )
             comment_text = comment.get('text')
             return {'comment': comment_text} if comment_text else {}
         except NotImplementedError as e:
@@ -200,171 +468,1184 @@ class TableCommentAnalyzer(AbstractDatabaseAnalyzer):
 
 
 class TableAccessAnalyzer(AbstractDatabaseAnalyzer):
+    """
+    Returns the privileges each grantee has on a table. Grants are fetched
+    for a whole schema with one query, the first time one of its tables is
+    analyzed, and the schema's other tables are answered from memory (see
+    `GrantCache`).
+    """
+
+    produces = ['access']
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+    ):
+        super().__init__(engine)
+        self.grants = GrantCache.for_engine(engine)
+
     def analyze_table(
         self,
         schema: str,
         table: str,
         is_view: bool = False
     ) -> dict[str, Any]:
-        with self.engine.connect() as conn:
-            results = {}
-            try:
-                rows = conn.execute(
-                    "SELECT * FROM information_schema.role_table_grants "
-                    "WHERE table_schema = %s AND table_name = %s",
-                    schema,
-                    table,
-                )
-                for row in rows.all():
-                    privilege_type = row['privilege_type']
-                    user_grants: dict[str, Any] = results.get(row['grantee'], {
-                        'privileges': [],
-                        'read': False,
-                        'write': False,
-                    })
-                    user_grants['privileges'].append(privilege_type)
-                    if privilege_type == 'SELECT':
-                        user_grants['read'] = True
-                    if privilege_type in ['INSERT', 'UPDATE', 'DELETE', 'TRUNCATE']:
-                        user_grants['write'] = True
-                    results[row['grantee']] = user_grants
-            except Exception as e:
-                # TODO probably need a more tightly bound exception here
-                # We probably don't have access to the information_schema, so
-                # skip it.
-                log.debug(
-                    'Unable to fetch access for table=%s.%s',
-                    schema,
-                    table,
-                    exc_info=e,
-                )
-            return {'access': results} if results else {}
+        results = {}
+        for grantee, privilege_type in self.grants.get(schema, table):
+            user_grants: dict[str, Any] = results.get(grantee, {
+                'privileges': [],
+                'read': False,
+                'write': False,
+            })
+            user_grants['privileges'].append(privilege_type)
+            if privilege_type == 'SELECT':
+                user_grants['read'] = True
+            if privilege_type in ['INSERT', 'UPDATE', 'DELETE', 'TRUNCATE']:
+                user_grants['write'] = True
+            results[grantee] = user_grants
+        return {'access': results} if results else {}
 
 
 class TableProfileAnalyzer(AbstractDatabaseAnalyzer):
+    """
+    Profiles a table's columns (min, max, nulls, distinct values, and so on)
+    with aggregate queries. Wide tables are profiled in chunks of
+    `chunk_columns` columns, one query per chunk, optionally in parallel and
+    with a `query_timeout`. Columns in a chunk that fails are marked with an
+    `error` instead of failing the whole profile.
+
+    When `mode` is `statistics`, the table isn't queried at all. Instead, the
+    profile is built from the database's own statistics (see
+    `DatabaseStatistics`): an estimated `count`, and `nulls`, `distinct`,
+    and `histogram` for columns that have statistics. These profiles are
+    marked with `estimated`.
+
+    Large tables can be sampled rather than fully scanned. Dialects that
+    support `TABLESAMPLE` (or Snowflake's `SAMPLE`) sample `sample_percent`
+    percent of the table. Other dialects read the first `sample_rows` rows
+    using a row-limit subquery. When `sample_threshold` is set, only tables
+    with more estimated rows than the threshold are sampled. Profiles of
+    sampled tables are marked with `sampled` and, when it's known,
+    `sample_fraction`.
+
+    When `approximate` is set, distinct counts are estimated, and numeric
+    columns get `p50`, `p95`, and `p99` quantiles. The dialect's native
+    functions (like `APPROX_COUNT_DISTINCT` and `APPROX_PERCENTILE`) are used
+    when it has them. Otherwise, the columns are streamed to Recap in chunks
+    and fed into HyperLogLog and quantile sketches (see `recap.sketches`),
+    which requires NumPy. Approximate profiles are marked with `approximate`.
+
+    Append-only tables can be profiled incrementally by configuring a
+    `watermark_columns` entry for them. Only rows with a watermark column
+    value greater than the last profile's maximum are profiled, and the
+    results are merged into the previous profile. Distinct counts and
+    quantiles use sketches, which are stored in the catalog, under
+    `profile_state`, so they can be merged in the next crawl.
+    """
+
+    produces = ['profile', 'profile_state']
+    consumes = ['columns']
+    reads_data = True
+
+    # Dialects that support `TABLESAMPLE` and the sampling methods they allow.
+    TABLESAMPLE_METHODS = {
+        'bigquery': ['SYSTEM'],
+        'mssql': ['SYSTEM'],
+        'postgresql': ['SYSTEM', 'BERNOULLI'],
+        'snowflake': ['SYSTEM', 'BERNOULLI'],
+    }
+
+    # Native approximate distinct count functions, by dialect.
+    APPROX_DISTINCT_FUNCTIONS = {
+        'bigquery': 'APPROX_COUNT_DISTINCT({column})',
+        'duckdb': 'approx_count_distinct({column})',
+        'mssql': 'APPROX_COUNT_DISTINCT({column})',
+        'oracle': 'APPROX_COUNT_DISTINCT({column})',
+        'redshift': 'APPROXIMATE COUNT(DISTINCT {column})',
+        'snowflake': 'APPROX_COUNT_DISTINCT({column})',
+        'trino': 'approx_distinct({column})',
+    }
+
+    # Native (approximate, or single-pass exact) quantile functions, by
+    # dialect. `fraction` is between 0 and 1; `percent` between 0 and 100.
+    QUANTILE_FUNCTIONS = {
+        'bigquery': 'APPROX_QUANTILES({column}, 100)[OFFSET({percent})]',
+        'duckdb': 'approx_quantile({column}, {fraction})',
+        'mssql': 'APPROX_PERCENTILE_DISC({fraction}) WITHIN GROUP (ORDER BY {column})',
+        'oracle': 'APPROX_PERCENTILE({fraction}) WITHIN GROUP (ORDER BY {column})',
+        'postgresql': 'PERCENTILE_DISC({fraction}) WITHIN GROUP (ORDER BY {column})',
+        'redshift': 'APPROXIMATE PERCENTILE_DISC({fraction}) WITHIN GROUP (ORDER BY {column})',
+        'snowflake': 'APPROX_PERCENTILE({column}, {fraction})',
+        'trino': 'approx_percentile({column}, {fraction})',
+    }
+
+    NUMERIC_TYPES = [
+        'BIGINT', 'FLOAT', 'INT', 'INTEGER', 'NUMERIC', 'REAL', 'SMALLINT'
+    ]
+    DATE_TYPES = [
+        'DATE', 'DATETIME', 'TIMESTAMP'
+    ]
+    # TODO Excluding 'JSON' because PG's 'JSONB' doesn't have LENGTH()
+    STRING_TYPES = [
+        'CHAR', 'CLOB', 'NCHAR', 'NVARCHAR', 'TEXT', 'VARCHAR'
+    ]
+    BINARY_TYPES = [
+        'BLOB', 'VARBINARY'
+    ]
+    STAT_TYPES = [
+        'min',
+        'max',
+        'average',
+        'sum',
+        'distinct',
+        'nulls',
+        'zeros',
+        'negatives',
+        'min_length',
+        'max_length',
+        'empty_strings',
+        'unix_epochs',
+        'p50',
+        'p95',
+        'p99',
+    ]
+
+    # Stats that are summed, or compared, when merging profiles.
+    ADDITIVE_STATS = [
+        'count',
+        'sum',
+        'nulls',
+        'zeros',
+        'negatives',
+        'empty_strings',
+        'unix_epochs',
+    ]
+    EXTREMUM_STATS = {
+        'min': min,
+        'max': max,
+        'min_length': min,
+        'max_length': max,
+    }
+
+    # Error codes for queries that were cancelled by a statement timeout, by
+    # dialect: PostgreSQL's query_canceled SQLSTATE, MySQL's
+    # ER_QUERY_TIMEOUT, Snowflake's statement cancelled and timeout errors,
+    # and SQLITE_INTERRUPT (from the progress handler in `_set_timeout`).
+    TIMEOUT_ERROR_CODES = {
+        'mysql': [3024],
+        'postgresql': ['57014'],
+        'snowflake': [604, 630],
+        'sqlite': [9],
+    }
+
+    # Quantile stat names and the fractions they're computed at.
+    QUANTILES = {
+        'p50': 0.5,
+        'p95': 0.95,
+        'p99': 0.99,
+    }
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        sample_percent: float | None = None,
+        sample_rows: int | None = None,
+        sample_threshold: int | None = None,
+        sample_method: str = 'SYSTEM',
+        mode: str = 'scan',
+        approximate: bool = False,
+        sketch_chunk_size: int = 10000,
+        watermark_columns: dict[str, str] = {},
+        chunk_columns: int | None = 50,
+        chunk_workers: int = 1,
+        query_timeout: float | None = None,
+    ):
+        """
+        :param sample_percent: Percent of a table to sample on dialects that
+            support `TABLESAMPLE`. On other dialects, the row limit is set to
+            this percent of the table's estimated rows, if known.
+        :param sample_rows: Maximum number of rows to read on dialects that
+            don't support `TABLESAMPLE` (or if `sample_percent` isn't set).
+        :param sample_threshold: Only sample tables with more estimated rows
+            than this. Tables without row estimates are always sampled.
+        :param sample_method: `SYSTEM` (block) or `BERNOULLI` (row) sampling.
+            Dialects that don't support the method fall back to `SYSTEM`.
+        :param mode: `scan` to profile by querying the table, or
+            `statistics` to profile using only the database's statistics.
+        :param approximate: Estimate distinct counts and quantiles.
+        :param sketch_chunk_size: Number of rows to fetch at a time when
+            streaming columns into sketches.
+        :param watermark_columns: Table patterns (`<schema>.<table>`, with
+            Unix shell-style wildcards) mapped to watermark columns. Matching
+            tables are profiled incrementally.
+        :param chunk_columns: Maximum number of columns to profile per
+            query. None profiles all columns in one query.
+        :param chunk_workers: Number of column chunks to profile in
+            parallel. Each runs on its own connection.
+        :param query_timeout: Seconds each profile query may run before it's
+            cancelled, for dialects that support statement timeouts.
+        """
+
+        assert mode in ['scan', 'statistics'], \
+            f"Unknown profile mode={mode}"
+        super().__init__(engine)
+        self.mode = mode
+        self.statistics = DatabaseStatistics.for_engine(engine)
+        self.sample_percent = sample_percent
+        self.sample_rows = sample_rows
+        self.sample_threshold = sample_threshold
+        self.sample_method = sample_method.upper()
+        self.approximate = approximate
+        self.sketch_chunk_size = sketch_chunk_size
+        self.watermark_columns = dict(watermark_columns)
+        self.chunk_columns = chunk_columns
+        self.chunk_workers = chunk_workers
+        self.query_timeout = query_timeout
+        # Sketches need NumPy, which is an optional dependency.
+        self.sketches = importlib.util.find_spec('numpy') is not None
+        if not self.sketches and self.approximate:
+            log.warning(
+                'NumPy is not installed, so approximate profiles only use '
+                'native approximate functions. On other dialects, distinct '
+                'counts are exact and there are no quantiles. Install it with '
+                '`pip install recap-core[sketches]`.'
+            )
+        if not self.sketches and self.watermark_columns:
+            log.warning(
+                'NumPy is not installed, so tables with watermark columns are '
+                'profiled in full. Install it with `pip install '
+                'recap-core[sketches]`.'
+            )
+            self.watermark_columns = {}
+        # Have the crawler pass in previous metadata, to merge profiles.
+        self.incremental = bool(self.watermark_columns)
+
     def analyze_table(
         self,
         schema: str,
         table: str,
         is_view: bool = False
     ) -> dict[str, Any]:
-        column_analyzer = TableColumnAnalyzer(self.engine)
+        if self.mode == 'statistics':
+            return self._analyze_statistics(schema, table)
+        results, _, _ = self._scan(schema, table, is_view=is_view)
+        return {'profile': results}
+
+    def analyze_with(
+        self,
+        path: PurePosixPath,
+        upstream: dict[str, Any],
+        previous: dict[str, Any],
+    ) -> dict[str, Any]:
+        """
+        Profiles a table using the columns from the column analyzer, if it
+        ran. If the table has a watermark column, only rows past the last
+        watermark are profiled, and they're merged into the previous profile.
+        If any column can't be profiled, nothing is merged and the watermark
+        stays where it was.
+        """
+
+        database_path = DatabasePath(path)
+        schema = database_path.schema
+        table = database_path.table
+        if not schema or not table or self.mode != 'scan':
+            return self.analyze(path)
+        is_view = path.parts[3] == 'views'
+        columns = upstream.get('columns')
+        watermark_column = self._watermark_column(schema, table)
+        if not watermark_column:
+            results, _, _ = self._scan(
+                schema,
+                table,
+                columns=columns,
+                is_view=is_view,
+            )
+            return {'profile': results}
+        profile = previous.get('profile') or {}
+        state = previous.get('profile_state') or {}
+        column_names = [
+            column['name']
+            for column in self.reflection.get('get_columns', table, schema)
+        ]
+        # Start over if the watermark column changed or columns were added.
+        if state.get('watermark_column') != watermark_column \
+            or state.get('watermark') is None \
+            or not set(column_names) <= set(profile.keys()):
+            profile = {}
+            state = {}
+        results, sketches, watermark = self._scan(
+            schema,
+            table,
+            watermark_column,
+            state.get('watermark'),
+            columns,
+        )
+        errors = [
+            column_name
+            for column_name, col_stats in results.items()
+            if 'error' in col_stats
+        ]
+        if errors:
+            # Merging would advance the watermark past rows that some columns
+            # weren't profiled for, so keep the previous profile and try
+            # again next time.
+            log.warning(
+                'Unable to profile columns=%s of table=%s.%s; not advancing '
+                'the watermark',
+                errors,
+                schema,
+                table,
+            )
+            if profile:
+                return {}
+            # Without profile_state, the next crawl starts over.
+            return {'profile': results}
+        new_rows = next(iter(results.values()), {}).get('count')
+        if not new_rows and profile:
+            # No new rows.
+            return {}
+        merged_results, merged_sketches = self._merge(
+            profile,
+            state.get('columns', {}),
+            results,
+            sketches,
+        )
+        return {
+            'profile': merged_results,
+            'profile_state': {
+                'watermark_column': watermark_column,
+                'watermark': self._watermark_value(
+                    watermark if watermark is not None
+                    else state.get('watermark')
+                ),
+                'columns': merged_sketches,
+            },
+        }
+
+    def _scan(
+        self,
+        schema: str,
+        table: str,
+        watermark_column: str | None = None,
+        watermark: Any = None,
+        columns: dict[str, Any] | None = None,
+        is_view: bool = False,
+    ) -> tuple[dict[str, Any], dict[str, dict[str, Any]], Any]:
+        """
+        Profiles a table with aggregate queries (plus sketches, if needed).
+        Columns are profiled in chunks of `chunk_columns`, each with its own
+        query.
+
+        :param watermark_column: Profile incrementally using this column.
+            Distinct counts and quantiles are always computed with sketches,
+            so they can be merged with a previous profile's, and the table
+            isn't sampled.
+        :param watermark: Only profile rows with a watermark column value
+            greater than this.
+        :param columns: The table's columns, as returned by
+            TableColumnAnalyzer. Reflected if not given.
+        :param is_view: Whether `table` is a view, which can't be sampled
+            with `TABLESAMPLE`.
+        :returns: Column stats, column sketches (if any), and the maximum
+            watermark column value (if a watermark column was given).
+        """
+
+        incremental = watermark_column is not None
         # TODO This is very proof-of-concept...
         # TODO ZOMG SQL injection attacks all over!
         # TODO Is db.Table().select the right way to paramaterize tables?
-        columns = column_analyzer \
-            .analyze_table(schema, table) \
-            .get('columns', {})
-        sql_col_queries = ''
-        numeric_types = [
-            'BIGINT', 'FLOAT', 'INT', 'INTEGER', 'NUMERIC', 'REAL', 'SMALLINT'
-        ]
-        date_types = [
-            'DATE', 'DATETIME', 'TIMESTAMP'
-        ]
-        # TODO Excluding 'JSON' because PG's 'JSONB' doesn't have LENGTH()
-        string_types = [
-            'CHAR', 'CLOB', 'NCHAR', 'NVARCHAR', 'TEXT', 'VARCHAR'
-        ]
-        binary_types = [
-            'BLOB', 'VARBINARY'
-        ]
-        stat_types = [
-            'min',
-            'max',
-            'average',
-            'sum',
-            'distinct',
-            'nulls',
-            'zeros',
-            'negatives',
-            'min_length',
-            'max_length',
-            'empty_strings',
-            'unix_epochs',
+        if columns is None:
+            columns = TableColumnAnalyzer(self.engine) \
+                .analyze_table(schema, table) \
+                .get('columns', {})
+        # Aggregate expressions for each column, keyed by stat type.
+        column_aggregates: dict[str, dict[str, str]] = {}
+        # Columns to stream into sketches, for dialects without native
+        # approximate functions (or when profiling incrementally).
+        sketch_columns: dict[str, dict[str, Any]] = {}
+        for column_name, column in columns.items():
+            generic_type = column.get('generic_type')
+            quoted_column_name = self._quote(column_name)
+            aggregates, sketch_stats = self._aggregates(
+                quoted_column_name,
+                generic_type,
+                incremental,
+            )
+            column_aggregates[column_name] = aggregates
+            if sketch_stats:
+                sketch_columns[column_name] = sketch_stats | {
+                    'quoted': quoted_column_name,
+                    'numeric': generic_type in self.NUMERIC_TYPES,
+                }
+        quoted_name = f"{self._quote(schema)}.{self._quote(table)}"
+
+        sample_fraction, sample_limit, upper_watermark = None, None, None
+        with self._connect() as conn:
+            if incremental:
+                from_clause, upper_watermark = self._watermark_from_clause(
+                    conn,
+                    quoted_name,
+                    watermark_column,
+                    watermark,
+                )
+            else:
+                from_clause, sample_fraction, sample_limit = self._from_clause(
+                    conn,
+                    schema,
+                    table,
+                    quoted_name,
+                    is_view,
+                )
+        if not from_clause:
+            # No rows past the watermark.
+            return {column_name: {'count': 0} for column_name in columns}, \
+                {}, None
+
+        column_names = list(columns.keys())
+        chunk_size = self.chunk_columns or len(column_names) or 1
+        chunks = [
+            column_names[i:i + chunk_size]
+            for i in range(0, len(column_names), chunk_size)
         ]
+        results = {}
+        if self.chunk_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(self.chunk_workers) as executor:
+                for chunk_results in executor.map(
+                    lambda chunk: self._profile_columns(
+                        from_clause,
+                        chunk,
+                        column_aggregates,
+                    ),
+                    chunks,
+                ):
+                    results |= chunk_results
+        else:
+            for chunk in chunks:
+                results |= self._profile_columns(
+                    from_clause,
+                    chunk,
+                    column_aggregates,
+                )
+
+        sketches = {}
+        if sketch_columns:
+            try:
+                with self._connect() as conn:
+                    sketches = self._sketch(conn, from_clause, sketch_columns)
+            except Exception as e:
+                log.debug(
+                    'Unable to sketch table=%s.%s columns=%s',
+                    schema,
+                    table,
+                    list(sketch_columns.keys()),
+                    exc_info=e,
+                )
+                for column_name in sketch_columns:
+                    results[column_name]['error'] = self._error_message(e)
+            for column_name, estimates in self._estimate(sketches).items():
+                results[column_name] |= estimates
+
+        # Without NumPy, some dialects fall back to exact distinct counts.
+        approximate_distinct = incremental or (self.approximate and (
+            self.sketches
+            or self.engine.dialect.name in self.APPROX_DISTINCT_FUNCTIONS
+        ))
+        # A row-limit sample that didn't hit its limit read every row.
+        sampled = sample_fraction is not None or (
+            sample_limit is not None
+            and any(
+                (col_stats.get('count') or 0) >= sample_limit
+                for col_stats in results.values()
+            )
+        )
+        for column_name, col_stats in results.items():
+            # Keep stats in a consistent order, no matter where they came from.
+            col_stats = {
+                stat_type: col_stats[stat_type]
+                for stat_type in ['count'] + self.STAT_TYPES + ['error']
+                if stat_type in col_stats
+            }
+            if approximate_distinct and 'distinct' in col_stats:
+                col_stats['approximate'] = True
+            if sampled and 'error' not in col_stats:
+                col_stats['sampled'] = True
+                if sample_fraction is not None:
+                    col_stats['sample_fraction'] = sample_fraction
+            results[column_name] = col_stats
+
+        return results, sketches, upper_watermark
+
+    def _aggregates(
+        self,
+        quoted_column_name: str,
+        generic_type: str | None,
+        incremental: bool = False,
+    ) -> tuple[dict[str, str], dict[str, bool]]:
+        """
+        :returns: Aggregate SQL expressions for a column, keyed by stat type,
+            and the stats (`distinct` and `quantiles`) that must be computed
+            with sketches instead.
+        """
+
+        dialect = self.engine.dialect.name
+        # BigQuery doesn't have VARCHAR, so use its type.
+        # TODO SQLAlchemy should expose a dialect type for a generic type.
+        varchar_type = 'STRING' if dialect == 'bigquery' else 'VARCHAR'
+        # SQLite doesn't support typed literals.
+        unix_epoch = "'1970-01-01 00:00:00'" if dialect == 'sqlite' \
+            else "TIMESTAMP '1970-01-01 00:00:00'"
+        column = quoted_column_name
+        nulls = f"SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END)"
+        if generic_type in self.NUMERIC_TYPES:
+            # TODO can we use a STRUCT or something here?
+            aggregates = {
+                'min': f"MIN({column})",
+                'max': f"MAX({column})",
+                'average': f"AVG({column})",
+                'sum': f"SUM({column})",
+                'nulls': nulls,
+                'zeros': f"SUM(CASE WHEN {column} = 0 THEN 1 ELSE 0 END)",
+                'negatives': f"SUM(CASE WHEN {column} < 0 THEN 1 ELSE 0 END)",
+            }
+        elif generic_type in self.STRING_TYPES:
+            aggregates = {
+                'min_length': f"MIN(LENGTH({column}))",
+                'max_length': f"MAX(LENGTH({column}))",
+                'nulls': nulls,
+                'empty_strings': f"SUM(CASE WHEN {column} LIKE '' THEN 1 ELSE 0 END)",
+            }
+        elif generic_type in self.BINARY_TYPES:
+            aggregates = {
+                'min_length': f"MIN(LENGTH({column}))",
+                'max_length': f"MAX(LENGTH({column}))",
+                'nulls': nulls,
+            }
+        elif generic_type in self.DATE_TYPES:
+            aggregates = {
+                'min': f"CAST(MIN({column}) AS {varchar_type})",
+                'max': f"CAST(MAX({column}) AS {varchar_type})",
+                'nulls': nulls,
+                'unix_epochs': f"SUM(CASE WHEN {column} = {unix_epoch} THEN 1 ELSE 0 END)",
+            }
+        else:
+            return {}, {}
+
+        sketch_stats = {}
+        distinct_sql = self._distinct_sql(dialect, column)
+        if distinct_sql and not incremental:
+            aggregates['distinct'] = distinct_sql
+        else:
+            sketch_stats['distinct'] = True
+        if (self.approximate or incremental) \
+            and generic_type in self.NUMERIC_TYPES:
+            quantile_function = self.QUANTILE_FUNCTIONS.get(dialect)
+            if quantile_function and not incremental:
+                for stat_type, fraction in self.QUANTILES.items():
+                    aggregates[stat_type] = quantile_function.format(
+                        column=column,
+                        fraction=fraction,
+                        percent=round(fraction * 100),
+                    )
+            elif self.sketches:
+                sketch_stats['quantiles'] = True
+        return aggregates, sketch_stats
+
+    def _profile_columns(
+        self,
+        from_clause: str,
+        column_names: List[str],
+        column_aggregates: dict[str, dict[str, str]],
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Profiles a chunk of columns with a single aggregate query. If the
+        query fails, the chunk is bisected (see `_bisect`), so one bad column
+        doesn't lose the rest of the chunk's stats. Columns that can't be
+        profiled get an `error` stat.
+
+        :returns: Stats for each column.
+        """
+
+        try:
+            return self._query_columns(
+                from_clause,
+                column_names,
+                column_aggregates,
+            )
+        except Exception as e:
+            return self._bisect(from_clause, column_names, column_aggregates, e)
+
+    def _bisect(
+        self,
+        from_clause: str,
+        column_names: List[str],
+        column_aggregates: dict[str, dict[str, str]],
+        error: Exception,
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Retries each half of a chunk whose query failed with `error`, and
+        keeps bisecting the halves that fail. Timeouts aren't retried, since
+        smaller queries over the same rows would likely time out too. If both
+        halves fail with the same kind of error, it's probably not caused by
+        a column (e.g. a missing table or a permission error), so bisecting
+        stops there.
+
+        :returns: Stats for each column.
+        """
+
+        if len(column_names) > 1 and not self._is_timeout(error):
+            middle = len(column_names) // 2
+            halves = [column_names[:middle], column_names[middle:]]
+            results = {}
+            failures = []
+            for half in halves:
+                try:
+                    results |= self._query_columns(
+                        from_clause,
+                        half,
+                        column_aggregates,
+                    )
+                except Exception as e:
+                    failures.append((half, e))
+            same_error = len(failures) == 2 and \
+                self._error_class(failures[0][1]) \
+                == self._error_class(failures[1][1])
+            for half, e in failures:
+                if same_error:
+                    results |= self._column_errors(half, e)
+                else:
+                    results |= self._bisect(
+                        from_clause,
+                        half,
+                        column_aggregates,
+                        e,
+                    )
+            return results
+        return self._column_errors(column_names, error)
+
+    def _query_columns(
+        self,
+        from_clause: str,
+        column_names: List[str],
+        column_aggregates: dict[str, dict[str, str]],
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Profiles columns with a single aggregate query. Raises if the query
+        fails.
+
+        :returns: Stats for each column.
+        """
+
+        # Alias by position; column names might not be valid (or short
+        # enough) to use in aliases.
+        select_list = ['COUNT(*) AS count']
+        aliases = {}
+        for index, column_name in enumerate(column_names):
+            for stat_type, aggregate in column_aggregates[column_name].items():
+                alias = f"{stat_type}_{index}"
+                select_list.append(f"{aggregate} AS {alias}")
+                aliases[alias] = (column_name, stat_type)
+        select_list_sql = '\n, '.join(select_list)
+        sql = f"""
+            SELECT
+                {select_list_sql}
+            FROM
+                {from_clause}
+        """
+        with self._connect() as conn:
+            row = dict(conn.execute(sql).first() or {})
+
+        results = {
+            column_name: {'count': row.get('count')}
+            for column_name in column_names
+        }
+        for alias, (column_name, stat_type) in aliases.items():
+            if alias in row:
+                stat_value = row[alias]
+                # JSON encoder can't handle decimal.Decimal
+                if isinstance(stat_value, decimal.Decimal):
+                    stat_value = float(stat_value)
+                results[column_name][stat_type] = stat_value
+        return results
+
+    def _column_errors(
+        self,
+        column_names: List[str],
+        e: Exception,
+    ) -> dict[str, dict[str, Any]]:
+        log.debug(
+            'Unable to profile columns=%s',
+            column_names,
+            exc_info=e,
+        )
+        error = self._error_message(e)
+        return {
+            column_name: {'error': error}
+            for column_name in column_names
+        }
+
+    @contextmanager
+    def _connect(self) -> Generator[sa.engine.Connection, None, None]:
+        """
+        Opens a connection for profile queries, with `query_timeout` applied
+        to each statement when the dialect supports it.
+        """
 
         with self.engine.connect() as conn:
-            varchar_type = 'VARCHAR'
-
-            # BigQuery doesn't havt FLOAT or VARCHAR, so use its type.
-            # TODO SQLAlchemy should expose a dialect type for a generic type.
-            if conn.dialect.name == 'bigquery':
-                float_type = 'FLOAT64'
-                varchar_type = 'STRING'
-            elif conn.dialect.name == 'snowflake':
+            if conn.dialect.name == 'snowflake':
                 conn.execute("ALTER SESSION SET QUOTED_IDENTIFIERS_IGNORE_CASE = TRUE")
+            if self.query_timeout is None:
+                yield conn
+                return
+            self._set_timeout(conn, self.query_timeout)
+            try:
+                yield conn
+            finally:
+                # Connections are pooled, so don't leak the timeout.
+                if not conn.invalidated:
+                    self._set_timeout(conn, None)
 
-            for column_name, column in columns.items():
-                generic_type = column.get('generic_type')
-                quoted_column_name = f'"{column_name}"'
-                if conn.dialect.name in ['bigquery', 'mysql']:
-                    quoted_column_name = f'`{column_name}`'
-                if generic_type in numeric_types:
-                    # TODO add approx median and quantiles
-                    # TODO can we use a STRUCT or something here?
-                    sql_col_queries += f"""
-                        , MIN({quoted_column_name}) AS min_{column_name}
-                        , MAX({quoted_column_name}) AS max_{column_name}
-                        , AVG({quoted_column_name}) AS average_{column_name}
-                        , SUM({quoted_column_name}) AS sum_{column_name}
-                        , COUNT(DISTINCT {quoted_column_name}) AS {column_name}_distinct
-                        , SUM(CASE WHEN {quoted_column_name} IS NULL THEN 1 ELSE 0 END) AS nulls_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} = 0 THEN 1 ELSE 0 END) AS zeros_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} < 0 THEN 1 ELSE 0 END) AS negatives_{column_name}
-                    """
-                if generic_type in string_types:
-                    sql_col_queries += f"""
-                        , MIN(LENGTH({quoted_column_name})) AS min_length_{column_name}
-                        , MAX(LENGTH({quoted_column_name})) AS max_length_{column_name}
-                        , COUNT(DISTINCT {quoted_column_name}) AS distinct_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} IS NULL THEN 1 ELSE 0 END) AS nulls_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} LIKE '' THEN 1 ELSE 0 END) AS empty_strings_{column_name}
-                    """
-                if generic_type in binary_types:
-                    sql_col_queries += f"""
-                        , MIN(LENGTH({quoted_column_name})) AS min_length_{column_name}
-                        , MAX(LENGTH({quoted_column_name})) AS max_length_{column_name}
-                        , COUNT(DISTINCT {quoted_column_name}) AS distinct_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} IS NULL THEN 1 ELSE 0 END) AS nulls_{column_name}
-                    """
-                if generic_type in date_types:
-                    sql_col_queries += f"""
-                        , CAST(MIN({quoted_column_name}) AS {varchar_type}) AS min_{column_name}
-                        , CAST(MAX({quoted_column_name}) AS {varchar_type}) AS max_{column_name}
-                        , COUNT(DISTINCT {quoted_column_name}) AS distinct_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} IS NULL THEN 1 ELSE 0 END) AS nulls_{column_name}
-                        , SUM(CASE WHEN {quoted_column_name} = TIMESTAMP '1970-01-01 00:00:00' THEN 1 ELSE 0 END) AS unix_epochs_{column_name}
-                    """
-
-            quoted_schema = f'"{schema}"'
-            quoted_table = f'"{table}"'
-            if conn.dialect.name in ['bigquery', 'mysql']:
-                quoted_schema = f'`{schema}`'
-                quoted_table = f'`{table}`'
-
-            sql = f"""
-                SELECT
-                    COUNT(*) AS count {sql_col_queries}
-                FROM
-                    {quoted_schema}.{quoted_table} t
-            """
-
-            rows = conn.execute(sql)
-            row = dict(rows.first() or {})
-            results = {}
+    @staticmethod
+    def _set_timeout(conn: sa.engine.Connection, seconds: float | None):
+        """
+        Sets (or, if `seconds` is None, clears) a connection's statement
+        timeout.
+        """
 
-            for column_name in columns.keys():
-                col_stats = results.get(column_name, {'count': row['count']})
-                for stat_type in stat_types:
-                    stat_name = f"{stat_type}_{column_name}"
-                    if stat_name in row:
-                        stat_value = row[stat_name]
-                        # JSON encoder can't handle decimal.Decimal
-                        import decimal
-                        if isinstance(row[stat_name], decimal.Decimal):
-                            stat_value = float(row[stat_name])
-                        col_stats[stat_type] = stat_value
-                results[column_name] = col_stats
+        dialect = conn.dialect.name
+        if dialect == 'postgresql':
+            conn.execute(
+                f"SET statement_timeout = {int(seconds * 1000)}"
+                if seconds is not None else "RESET statement_timeout"
+            )
+        elif dialect == 'mysql':
+            milliseconds = int(seconds * 1000) if seconds is not None else 0
+            conn.execute(f"SET SESSION max_execution_time = {milliseconds}")
+        elif dialect == 'snowflake':
+            conn.execute(
+                f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {int(seconds)}"
+                if seconds is not None
+                else "ALTER SESSION UNSET STATEMENT_TIMEOUT_IN_SECONDS"
+            )
+        elif dialect == 'sqlite':
+            # SQLite has no statement timeout, but a progress handler can
+            # interrupt long-running statements.
+            if seconds is None:
+                conn.connection.set_progress_handler(None, 0)
+            else:
+                deadline = time.monotonic() + seconds
+                conn.connection.set_progress_handler(
+                    lambda: time.monotonic() > deadline,
+                    10000,
+                )
+        else:
+            log.debug('Query timeouts are not supported for dialect=%s', dialect)
 
-            return {'profile': results}
+    @staticmethod
+    def _error_message(e: Exception) -> str:
+        # SQLAlchemy's messages include the (very long) statement.
+        return str(getattr(e, 'orig', None) or e)
+
+    @staticmethod
+    def _error_code(e: Exception) -> Any:
+        """
+        :returns: The database's error code for an exception, if the driver
+            exposes one: a SQLSTATE for PostgreSQL, or an error number for
+            MySQL, Snowflake, and SQLite.
+        """
+
+        orig = getattr(e, 'orig', None) or e
+        for attribute in ['pgcode', 'sqlstate', 'sqlite_errorcode', 'errno']:
+            code = getattr(orig, attribute, None)
+            if code is not None:
+                return code
+        # MySQL drivers put the error number first.
+        args = getattr(orig, 'args', ())
+        if args and isinstance(args[0], int):
+            return args[0]
+        return None
+
+    def _error_class(self, e: Exception) -> tuple[str, Any]:
+        orig = getattr(e, 'orig', None) or e
+        return type(orig).__name__, self._error_code(e)
+
+    def _is_timeout(self, e: Exception) -> bool:
+        """
+        :returns: True if a query was cancelled by `query_timeout`.
+        """
+
+        timeout_codes = self.TIMEOUT_ERROR_CODES.get(
+            self.engine.dialect.name,
+            [],
+        )
+        if self._error_code(e) in timeout_codes:
+            return True
+        # sqlite3 errors only have codes on Python 3.11+. Before that, an
+        # interrupted statement is only recognizable by its message.
+        orig = getattr(e, 'orig', None) or e
+        return isinstance(orig, sqlite3.OperationalError) \
+            and str(orig) == 'interrupted'
+
+    def _quote(self, name: str) -> str:
+        if self.engine.dialect.name in ['bigquery', 'mysql']:
+            return f'`{name}`'
+        return f'"{name}"'
+
+    def _watermark_from_clause(
+        self,
+        conn: sa.engine.Connection,
+        quoted_name: str,
+        watermark_column: str,
+        watermark: Any,
+    ) -> tuple[str | None, Any]:
+        """
+        Finds the newest watermark column value, and builds a FROM clause
+        for rows between the previous watermark and it. Every profile query
+        uses the same bounds, so rows added mid-profile are left for the
+        next crawl.
+
+        :returns: A FROM clause and the new watermark, or (None, None) if
+            there are no rows past the previous watermark.
+        """
+
+        quoted_watermark_column = self._quote(watermark_column)
+        conditions = []
+        if watermark is not None:
+            conditions.append(
+                f"{quoted_watermark_column} > {self._watermark_literal(watermark)}"
+            )
+        where_clause = f"WHERE {conditions[0]}" if conditions else ''
+        upper_watermark = conn.execute(
+            f"SELECT MAX({quoted_watermark_column}) FROM {quoted_name} "
+            f"{where_clause}"
+        ).scalar()
+        if upper_watermark is None:
+            return None, None
+        conditions.append(
+            f"{quoted_watermark_column} <= {self._watermark_literal(upper_watermark)}"
+        )
+        return f"""(
+            SELECT * FROM {quoted_name}
+            WHERE {' AND '.join(conditions)}
+        ) t""", upper_watermark
+
+    def _distinct_sql(self, dialect: str, quoted_column_name: str) -> str | None:
+        """
+        :returns: A distinct count expression for a column, or None if the
+            column must be streamed into a sketch instead.
+        """
+
+        if self.approximate:
+            function = self.APPROX_DISTINCT_FUNCTIONS.get(dialect)
+            if function:
+                return function.format(column=quoted_column_name)
+            if self.sketches:
+                return None
+        return f"COUNT(DISTINCT {quoted_column_name})"
+
+    def _sketch(
+        self,
+        conn: sa.engine.Connection,
+        from_clause: str,
+        sketch_columns: dict[str, dict[str, Any]],
+    ) -> dict[str, Any]:
+        """
+        Streams columns from the database in chunks, and feeds them into
+        HyperLogLog and quantile sketches.
+
+        :returns: A dictionary of sketches for each column, keyed by the stat
+            they estimate (`distinct` or `quantiles`).
+        """
+
+        # NumPy is optional, so only import sketches when they're needed.
+        from recap.sketches import (
+            as_floats,
+            hash_values,
+            HyperLogLog,
+            QuantileSketch,
+        )
+
+        column_names = list(sketch_columns.keys())
+        hlls = {
+            column_name: HyperLogLog()
+            for column_name in column_names
+            if sketch_columns[column_name].get('distinct')
+        }
+        quantile_sketches = {
+            column_name: QuantileSketch()
+            for column_name in column_names
+            if sketch_columns[column_name].get('quantiles')
+        }
+        select_list = ', '.join(
+            sketch_columns[column_name]['quoted']
+            for column_name in column_names
+        )
+        rows = conn \
+            .execution_options(stream_results=True) \
+            .execute(f"SELECT {select_list} FROM {from_clause}")
+        while chunk := rows.fetchmany(self.sketch_chunk_size):
+            for column_name, values in zip(column_names, zip(*chunk)):
+                numeric = sketch_columns[column_name]['numeric']
+                if column_name in hlls:
+                    hlls[column_name].update(hash_values(values, numeric))
+                if column_name in quantile_sketches:
+                    quantile_sketches[column_name].update(as_floats(values))
+
+        sketches: dict[str, dict[str, Any]] = {}
+        for column_name, hll in hlls.items():
+            sketches.setdefault(column_name, {})['distinct'] = hll
+        for column_name, quantile_sketch in quantile_sketches.items():
+            sketches.setdefault(column_name, {})['quantiles'] = quantile_sketch
+        return sketches
+
+    def _estimate(
+        self,
+        sketches: dict[str, dict[str, Any]],
+    ) -> dict[str, dict[str, Any]]:
+        """
+        :returns: Stats estimated from each column's sketches.
+        """
+
+        results = {}
+        for column_name, column_sketches in sketches.items():
+            col_stats = results.setdefault(column_name, {})
+            if 'distinct' in column_sketches:
+                col_stats['distinct'] = column_sketches['distinct'].estimate()
+            if 'quantiles' in column_sketches:
+                quantiles = column_sketches['quantiles'].quantiles(
+                    list(self.QUANTILES.values()),
+                )
+                col_stats |= dict(zip(self.QUANTILES, quantiles))
+        return results
+
+    def _merge(
+        self,
+        previous_results: dict[str, Any],
+        previous_sketches: dict[str, dict[str, Any]],
+        results: dict[str, Any],
+        sketches: dict[str, dict[str, Any]],
+    ) -> tuple[dict[str, Any], dict[str, dict[str, Any]]]:
+        """
+        Merges the profile of new rows into a previous profile. Counts and
+        sums are added, minimums and maximums are compared, and sketches are
+        merged.
+
+        :param previous_sketches: Serialized sketches from the previous
+            profile's state.
+        :returns: Merged column stats, and serialized merged sketches.
+        """
+
+        from recap.sketches import HyperLogLog, QuantileSketch
+
+        merged_results = {}
+        merged_sketches = {}
+        for column_name, col_stats in results.items():
+            col_stats = dict(col_stats)
+            previous_stats = previous_results.get(column_name, {})
+            for stat_type in self.ADDITIVE_STATS:
+                if previous_stats.get(stat_type) is not None:
+                    col_stats[stat_type] = previous_stats[stat_type] \
+                        + (col_stats.get(stat_type) or 0)
+            for stat_type, combine in self.EXTREMUM_STATS.items():
+                values = [
+                    value
+                    for value in [
+                        previous_stats.get(stat_type),
+                        col_stats.get(stat_type),
+                    ]
+                    if value is not None
+                ]
+                if values:
+                    col_stats[stat_type] = combine(values)
+            if 'average' in col_stats:
+                non_nulls = col_stats['count'] - col_stats.get('nulls', 0)
+                col_stats['average'] = col_stats['sum'] / non_nulls \
+                    if non_nulls and col_stats.get('sum') is not None \
+                    else None
+            column_sketches = sketches.get(column_name, {})
+            previous_column_sketches = previous_sketches.get(column_name, {})
+            serialized_sketches = {}
+            if 'distinct' in column_sketches:
+                hll = column_sketches['distinct']
+                if 'distinct' in previous_column_sketches:
+                    hll.merge(HyperLogLog.from_dict(
+                        previous_column_sketches['distinct'],
+                    ))
+                col_stats['distinct'] = hll.estimate()
+                serialized_sketches['distinct'] = hll.to_dict()
+            if 'quantiles' in column_sketches:
+                quantile_sketch = column_sketches['quantiles']
+                if 'quantiles' in previous_column_sketches:
+                    quantile_sketch.merge(QuantileSketch.from_dict(
+                        previous_column_sketches['quantiles'],
+                    ))
+                quantiles = quantile_sketch.quantiles(
+                    list(self.QUANTILES.values()),
+                )
+                col_stats |= {
+                    stat_type: quantile
+                    for stat_type, quantile in zip(self.QUANTILES, quantiles)
+                    if quantile is not None
+                }
+                serialized_sketches['quantiles'] = quantile_sketch.to_dict()
+            if serialized_sketches:
+                merged_sketches[column_name] = serialized_sketches
+            merged_results[column_name] = col_stats
+        return merged_results, merged_sketches
+
+    def _watermark_column(self, schema: str, table: str) -> str | None:
+        """
+        :returns: The first configured watermark column whose table pattern
+            matches `<schema>.<table>`, if the table has that column.
+        """
+
+        column_names = [
+            column['name']
+            for column in self.reflection.get('get_columns', table, schema)
+        ]
+        for pattern, column_name in self.watermark_columns.items():
+            if fnmatch.fnmatch(f"{schema}.{table}", pattern) \
+                and column_name in column_names:
+                return column_name
+        return None
+
+    @staticmethod
+    def _watermark_value(value: Any) -> Any:
+        """
+        :returns: A JSON-serializable watermark value.
+        """
+
+        if isinstance(value, decimal.Decimal):
+            return int(value) if value == int(value) else float(value)
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        # Dates, times, and so on.
+        return str(value)
+
+    @staticmethod
+    def _watermark_literal(value: Any) -> str:
+        """
+        :returns: A SQL literal for a watermark value.
+        """
+
+        if isinstance(value, (int, float, decimal.Decimal)) \
+            and not isinstance(value, bool):
+            return str(value)
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
+
+    def _from_clause(
+        self,
+        conn: sa.engine.Connection,
+        schema: str,
+        table: str,
+        quoted_name: str,
+        is_view: bool = False,
+    ) -> tuple[str, float | None, int | None]:
+        """
+        Builds the profile query's FROM clause, sampling the table if
+        sampling is configured and the table is large enough.
+
+        Views can't be sampled with `TABLESAMPLE`, and don't have row
+        estimates, so they're read with the `sample_rows` row limit (or not
+        sampled at all if it isn't set).
+
+        :returns: A FROM clause, the fraction of the table it samples (if
+            known), and its row limit (if it uses one).
+        """
+
+        if self.sample_percent is None and self.sample_rows is None:
+            return f"{quoted_name} t", None, None
+
+        dialect = conn.dialect.name
+        methods = None if is_view else self.TABLESAMPLE_METHODS.get(dialect)
+        estimated_rows = None
+        if not is_view and (
+            self.sample_threshold is not None
+            or (self.sample_percent is not None and not methods)
+        ):
+            estimated_rows = self.statistics.get(schema, table).get('rows')
+        if self.sample_threshold is not None \
+            and estimated_rows is not None \
+            and estimated_rows <= self.sample_threshold:
+            return f"{quoted_name} t", None, None
+
+        if self.sample_percent is not None and methods:
+            method = self.sample_method if self.sample_method in methods \
+                else 'SYSTEM'
+            percent = self.sample_percent
+            # BigQuery and SQL Server want an explicit PERCENT unit.
+            if dialect in ['bigquery', 'mssql']:
+                return (
+                    f"{quoted_name} TABLESAMPLE {method} ({percent} PERCENT)",
+                    percent / 100,
+                    None,
+                )
+            return (
+                f"{quoted_name} TABLESAMPLE {method} ({percent})",
+                percent / 100,
+                None,
+            )
+
+        limit = self.sample_rows
+        if self.sample_percent is not None and estimated_rows:
+            limit = max(1, int(estimated_rows * self.sample_percent / 100))
+        if limit is None:
+            # Percent sampling of a view, or on a dialect without TABLESAMPLE
+            # or estimates.
+            log.debug(
+                'Unable to sample table=%s.%s; profiling all rows',
+                schema,
+                table,
+            )
+            return f"{quoted_name} t", None, None
+        # Let SQLAlchemy pick the dialect's row-limit syntax (LIMIT, TOP...).
+        subquery = sa.select(sa.text('*')) \
+            .select_from(sa.text(quoted_name)) \
+            .limit(limit) \
+            .compile(conn, compile_kwargs={'literal_binds': True})
+        sample_fraction = min(1.0, limit / estimated_rows) \
+            if estimated_rows else None
+        return f"({subquery}) t", sample_fraction, limit
+
+    def _analyze_statistics(
+        self,
+        schema: str,
+        table: str,
+    ) -> dict[str, Any]:
+        """
+        :returns: A profile built from the database's statistics, without
+            querying the table.
+        """
+
+        table_stats = self.statistics.get(schema, table)
+        rows = table_stats.get('rows')
+        column_stats = table_stats.get('columns', {})
+        columns = self.reflection.get('get_columns', table, schema)
+        results = {}
+        for column in columns:
+            col_stats: dict[str, Any] = {'estimated': True}
+            if rows is not None:
+                col_stats['count'] = rows
+            stats = column_stats.get(column['name'], {})
+            null_fraction = stats.get('null_fraction')
+            if null_fraction is not None and rows is not None:
+                col_stats['nulls'] = round(null_fraction * rows)
+            if stats.get('distinct') is not None:
+                col_stats['distinct'] = stats['distinct']
+            if stats.get('histogram'):
+                col_stats['histogram'] = stats['histogram']
+            # Skip columns we know nothing about.
+            if len(col_stats) > 1:
+                results[column['name']] = col_stats
+        return {'profile': results} if results else {}
+
+    @classmethod
+    @contextmanager
+    def open(cls, **config) -> Generator['TableProfileAnalyzer', None, None]:
+        assert 'url' in config, \
+            f"Config for {cls.__name__} is missing `url` config."
+        engine = create_engine(
+            config['url'],
+            **config.get('engine', {}),
+        )
+        yield cls(engine, **config.get('profile', {}))
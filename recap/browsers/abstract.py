@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from pathlib import PurePosixPath
-from typing import Generator, List
+from typing import Generator, Iterable
 
 
 class AbstractBrowser(ABC):
@@ -31,16 +31,42 @@ class AbstractBrowser(ABC):
     """
 
     @abstractmethod
-    def children(self, path: PurePosixPath) -> List[str]:
+    def children(self, path: PurePosixPath) -> Iterable[str]:
         """
         Given a path, returns its children. Using the example above,
         path="/streaming/kafka/instances/log-cluster/streams" would return:
 
             ["access-logs", "error-logs"]
+
+        Browsers may return a generator. The crawler consumes children lazily,
+        so it starts crawling the first children while the rest are still
+        being listed.
         """
 
         raise NotImplementedError
 
+    def fingerprint(self, path: PurePosixPath) -> str | None:
+        """
+        Returns a cheap fingerprint for a path. The fingerprint should change
+        whenever the path's metadata might have changed. The crawler uses it to
+        skip analyzing paths that haven't changed since the last crawl.
+
+        :returns: A fingerprint string, or None if the path can't be
+            fingerprinted (it will always be analyzed).
+        """
+
+        return None
+
+    def fingerprints_data(self, path: PurePosixPath) -> bool:
+        """
+        :returns: True if a path's fingerprint changes when its data changes,
+            not just its schema. If it doesn't, the crawler still runs
+            analyzers that read data (see `AbstractAnalyzer.reads_data`) on
+            paths whose fingerprint hasn't changed.
+        """
+
+        return False
+
     @staticmethod
     @abstractmethod
     def root(**config) -> PurePosixPath:
@@ -1,15 +1,111 @@
+import hashlib
+import inspect
 import logging
 import sqlalchemy as sa
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 from .abstract import AbstractBrowser
 from pathlib import PurePosixPath
-from typing import Callable, Generator, List
+from recap.engines import create_engine, engine_state
+from typing import Any, Callable, Generator, Iterator, List
 from urllib.parse import urlparse
 
 
 log = logging.getLogger(__name__)
 
 
+# Default maximum number of reflection results to keep per engine.
+DEFAULT_REFLECTION_CACHE_SIZE = 4096
+
+# Default maximum number of schemas to keep bulk reflection results for.
+DEFAULT_REFLECTION_CACHE_SCHEMAS = 4
+
+# Default number of names to fetch per page, for dialects that can page
+# through listings.
+DEFAULT_LISTING_PAGE_SIZE = 10000
+
+# Default maximum number of tables to remember last-change markers for,
+# between fingerprinting a table and deciding whether to analyze its data.
+DEFAULT_LAST_CHANGE_CACHE_SIZE = 1024
+
+# Inspector methods that can be loaded for a whole schema at once, and the
+# schema-wide Inspector methods (SQLAlchemy 2.0+) that load them.
+BULK_REFLECTION_METHODS = {
+    'get_columns': 'get_multi_columns',
+    'get_indexes': 'get_multi_indexes',
+    'get_pk_constraint': 'get_multi_pk_constraint',
+    'get_foreign_keys': 'get_multi_foreign_keys',
+    'get_table_comment': 'get_multi_table_comment',
+}
+
+# The parameters of the PostgreSQL dialect's private `_get_column_info`,
+# which `_load_postgresql_columns` uses to parse columns like `get_columns`
+# does. Its signature has changed between SQLAlchemy releases; if it doesn't
+# match, columns are reflected one table at a time instead.
+POSTGRESQL_COLUMN_INFO_PARAMETERS = (
+    'name',
+    'format_type',
+    'default',
+    'notnull',
+    'domains',
+    'enums',
+    'schema',
+    'comment',
+    'generated',
+    'identity',
+)
+
+# Inspector methods whose results are included in table fingerprints, in
+# addition to `get_columns`. These cover the metadata that the database
+# analyzers reflect.
+FINGERPRINT_REFLECTION_METHODS = [
+    'get_pk_constraint',
+    'get_foreign_keys',
+    'get_indexes',
+    'get_table_comment',
+]
+
+# Queries for a marker that changes when a table's data changes, by dialect.
+# Dialects without one can't detect data changes from a fingerprint.
+LAST_CHANGE_QUERIES = {
+    'mysql': """
+        SELECT CREATE_TIME, UPDATE_TIME
+        FROM information_schema.tables
+        WHERE table_schema = :schema AND table_name = :table
+    """,
+    'postgresql': """
+        SELECT n_tup_ins, n_tup_upd, n_tup_del
+        FROM pg_stat_all_tables
+        WHERE schemaname = :schema AND relname = :table
+    """,
+    'snowflake': """
+        SELECT LAST_ALTERED
+        FROM information_schema.tables
+        WHERE table_schema = :schema AND table_name = :table
+    """,
+}
+
+
+def _has_postgresql_column_helpers(dialect: sa.engine.Dialect) -> bool:
+    """
+    :returns: True if a PostgreSQL dialect has the private helpers that
+        `ReflectionCache._load_postgresql_columns` uses, with the signatures
+        it expects.
+    """
+
+    if not all(
+        hasattr(dialect, helper)
+        for helper in ('_get_column_info', '_load_domains', '_load_enums')
+    ):
+        return False
+    try:
+        parameters = inspect.signature(dialect._get_column_info).parameters
+    except (TypeError, ValueError):
+        return False
+    return tuple(parameters) == POSTGRESQL_COLUMN_INFO_PARAMETERS
+
+
 class DatabasePath:
     """
     Helper that exposes schema and table (or view) from a database path.
@@ -21,6 +117,522 @@ class DatabasePath:
         self.table = path.parts[4] if len(path.parts) > 4 else None
 
 
+# Default for BoundedCache.get, to tell missing entries apart from entries
+# whose value is None.
+MISSING = object()
+
+
+class BoundedCache(OrderedDict):
+    """
+    A thread-safe dictionary that evicts its least recently used entries once
+    it holds more than `max_size` entries.
+
+    Other threads can evict an entry between `key in cache` and `cache[key]`,
+    so use `get` (or `get_or_load`) to look entries up.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        # Key -> lock, for keys that `get_or_load` is loading.
+        self.loading: dict[Any, threading.Lock] = {}
+
+    def __getitem__(self, key: Any) -> Any:
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self.lock:
+            try:
+                return self[key]
+            except KeyError:
+                return default
+
+    def get_or_load(self, key: Any, load: Callable[[], Any]) -> Any:
+        """
+        :returns: A key's value. If it isn't cached, it's loaded with `load`
+            and cached. Only one thread loads a key at a time; the others
+            wait and use its value.
+        """
+
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        with self.lock:
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                value = self.get(key, MISSING)
+                if value is MISSING:
+                    value = load()
+                    self[key] = value
+                return value
+        finally:
+            # Locks are only kept while their key is being loaded.
+            with self.lock:
+                if self.loading.get(key) is key_lock:
+                    del self.loading[key]
+
+    def __setitem__(self, key: Any, value: Any):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.max_size:
+                # Not popitem, which calls __getitem__ (and move_to_end) on
+                # subclasses before Python 3.11.
+                super().__delitem__(next(iter(self)))
+
+
+class ReflectionCache:
+    """
+    Caches SQLAlchemy reflection results for an engine. All database analyzers
+    (and the database browser) that share an engine share its
+    ReflectionCache, so a table's columns, indexes, and so on are reflected
+    once per crawl rather than once per analyzer.
+
+    When SQLAlchemy's schema-wide Inspector methods (`get_multi_columns` and
+    friends) are available, the first lookup in a schema reflects every table
+    in the schema at once, and the rest of the schema's tables are served from
+    memory. A schema crawl then takes a handful of queries rather than several
+    per table. On older versions of SQLAlchemy, PostgreSQL's columns, primary
+    keys, and indexes are loaded for a whole schema with a query each, in
+    the same format as SQLAlchemy's PostgreSQL dialect returns them (see
+    `_load_postgresql_columns` and friends). Otherwise, or if the dialect's
+    private helpers have changed, tables are reflected one at a time.
+
+    ReflectionCache uses a single Inspector. The per-table results, the
+    schema-wide results, and the Inspector's own `info_cache` are all
+    bounded, so memory stays flat no matter how many tables are crawled.
+
+    Results are shared between callers. Don't modify them; copy first.
+    """
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        max_size: int = DEFAULT_REFLECTION_CACHE_SIZE,
+        max_schemas: int = DEFAULT_REFLECTION_CACHE_SCHEMAS,
+    ):
+        self.inspector = sa.inspect(engine)
+        self.inspector.info_cache = BoundedCache(max_size)
+        self.results = BoundedCache(max_size)
+        # (method, schema) -> {table: result}, or None if the schema couldn't
+        # be reflected in bulk.
+        self.schemas = BoundedCache(max_schemas)
+
+    def get(self, method: str, table: str, schema: str) -> Any:
+        """
+        Calls an Inspector method (`get_columns`, `get_indexes`, and so on)
+        for a table, or returns its cached result.
+        """
+
+        key = (method, schema, table)
+        try:
+            return self.results[key]
+        except KeyError:
+            pass
+        schema_results = self._get_schema(method, schema)
+        if schema_results and table in schema_results:
+            return schema_results[table]
+        # Not bulk-loadable, or the table is new since the schema was loaded.
+        result = getattr(self.inspector, method)(table, schema)
+        self.results[key] = result
+        return result
+
+    def _get_schema(self, method: str, schema: str) -> dict[str, Any] | None:
+        """
+        :returns: A method's results for every table and view in a schema,
+            keyed by table name. None if the method can't be loaded in bulk.
+        """
+
+        bulk_method = BULK_REFLECTION_METHODS.get(method)
+        if bulk_method and hasattr(self.inspector, bulk_method):
+            loader = lambda: self._load_multi(bulk_method, schema)
+        else:
+            dialect_loader = getattr(
+                self,
+                f"_load_{self.inspector.dialect.name}_{method[4:]}",
+                None,
+            )
+            if not dialect_loader:
+                return None
+            loader = lambda: dialect_loader(schema)
+
+        def load() -> dict[str, Any] | None:
+            try:
+                log.debug(
+                    'Reflecting schema=%s in bulk for method=%s',
+                    schema,
+                    method,
+                )
+                return loader()
+            except Exception as e:
+                # Fall back to reflecting one table at a time, which raises
+                # (or doesn't) per table, as callers expect.
+                log.debug(
+                    'Unable to reflect schema=%s in bulk for method=%s',
+                    schema,
+                    method,
+                    exc_info=e,
+                )
+                return None
+
+        # Only one thread loads a schema; the others wait and use its results.
+        return self.schemas.get_or_load((method, schema), load)
+
+    def _load_multi(self, bulk_method: str, schema: str) -> dict[str, Any]:
+        """
+        Loads a schema with one of SQLAlchemy's (2.0+) schema-wide Inspector
+        methods.
+        """
+
+        multi_results = getattr(self.inspector, bulk_method)(
+            schema=schema,
+            kind=sa.engine.reflection.ObjectKind.ANY,
+        )
+        # Keys are (schema, table) tuples.
+        return {
+            table: result
+            for (_, table), result in multi_results.items()
+        }
+
+    def _load_postgresql_columns(self, schema: str) -> dict[str, Any] | None:
+        """
+        Loads every relation's columns in a schema with one query. Column
+        types are parsed by the dialect, just as `get_columns` does.
+
+        :returns: None if the dialect's (private) column parsing helpers
+            aren't the ones this was written against, in which case tables
+            are reflected one at a time with `get_columns`.
+        """
+
+        dialect = self.inspector.dialect
+        if not _has_postgresql_column_helpers(dialect):
+            log.debug(
+                'Unable to load columns for schema=%s in bulk; '
+                'unsupported SQLAlchemy version=%s',
+                schema,
+                sa.__version__,
+            )
+            return None
+        generated = 'a.attgenerated' \
+            if dialect.server_version_info >= (12,) else 'NULL'
+        # The same identity options query as `get_columns`.
+        identity = """
+            (SELECT json_build_object(
+                'always', a.attidentity = 'a',
+                'start', s.seqstart,
+                'increment', s.seqincrement,
+                'minvalue', s.seqmin,
+                'maxvalue', s.seqmax,
+                'cache', s.seqcache,
+                'cycle', s.seqcycle)
+            FROM pg_catalog.pg_sequence s
+            JOIN pg_catalog.pg_class sc ON s.seqrelid = sc.oid
+            WHERE sc.relkind = 'S'
+            AND a.attidentity != ''
+            AND s.seqrelid = pg_catalog.pg_get_serial_sequence(
+                a.attrelid::regclass::text, a.attname
+            )::regclass::oid)
+        """ if dialect.server_version_info >= (10,) else 'NULL'
+        with self.inspector.bind.connect() as conn:
+            rows = conn.execute(sa.text(f"""
+                SELECT
+                    c.relname,
+                    a.attname,
+                    pg_catalog.format_type(a.atttypid, a.atttypmod),
+                    pg_catalog.pg_get_expr(d.adbin, d.adrelid),
+                    a.attnotnull,
+                    pgd.description,
+                    {generated},
+                    {identity}
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+                LEFT JOIN pg_catalog.pg_attrdef d
+                    ON d.adrelid = a.attrelid
+                    AND d.adnum = a.attnum
+                    AND a.atthasdef
+                LEFT JOIN pg_catalog.pg_description pgd
+                    ON pgd.objoid = a.attrelid
+                    AND pgd.objsubid = a.attnum
+                WHERE n.nspname = :schema
+                    AND c.relkind IN ('r', 'v', 'm', 'f', 'p')
+                    AND a.attnum > 0
+                    AND NOT a.attisdropped
+                ORDER BY c.relname, a.attnum
+            """), {'schema': schema}).fetchall()
+            try:
+                domains = dialect._load_domains(conn)
+                enums = {
+                    (
+                        (enum['name'],) if enum['visible']
+                        else (enum['schema'], enum['name'])
+                    ): enum
+                    for enum in dialect._load_enums(conn, schema='*')
+                }
+            except (AttributeError, KeyError, TypeError) as e:
+                log.warning(
+                    'Unable to load domains and enums for schema=%s in '
+                    'bulk with SQLAlchemy version=%s',
+                    schema,
+                    sa.__version__,
+                    exc_info=e,
+                )
+                return None
+        tables: dict[str, List[dict[str, Any]]] = {}
+        for (
+            table,
+            name,
+            format_type,
+            default,
+            notnull,
+            comment,
+            generated,
+            identity_options,
+        ) in rows:
+            try:
+                # Keyword arguments, so a changed signature raises rather
+                # than silently passing values to the wrong parameters.
+                column = dialect._get_column_info(
+                    name=name,
+                    format_type=format_type,
+                    default=default,
+                    notnull=notnull,
+                    domains=domains,
+                    enums=enums,
+                    schema=schema,
+                    comment=comment,
+                    generated=generated,
+                    identity=identity_options,
+                )
+            except (AttributeError, KeyError, TypeError) as e:
+                log.warning(
+                    'Unable to parse columns for schema=%s in bulk with '
+                    'SQLAlchemy version=%s',
+                    schema,
+                    sa.__version__,
+                    exc_info=e,
+                )
+                return None
+            tables.setdefault(table, []).append(column)
+        return tables
+
+    def _load_postgresql_pk_constraint(self, schema: str) -> dict[str, Any]:
+        """
+        Loads every relation's primary key in a schema with one query.
+        """
+
+        with self.inspector.bind.connect() as conn:
+            rows = conn.execute(sa.text("""
+                SELECT c.relname, con.conname, a.attname
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                LEFT JOIN pg_catalog.pg_constraint con
+                    ON con.conrelid = c.oid AND con.contype = 'p'
+                LEFT JOIN LATERAL unnest(con.conkey)
+                    WITH ORDINALITY AS k(attnum, ord) ON true
+                LEFT JOIN pg_catalog.pg_attribute a
+                    ON a.attrelid = c.oid AND a.attnum = k.attnum
+                WHERE n.nspname = :schema
+                    AND c.relkind IN ('r', 'v', 'm', 'f', 'p')
+                ORDER BY c.relname, k.ord
+            """), {'schema': schema}).fetchall()
+        tables: dict[str, dict[str, Any]] = {}
+        for table, name, column in rows:
+            pk = tables.setdefault(table, {
+                'constrained_columns': [],
+                'name': name,
+            })
+            if column is not None:
+                pk['constrained_columns'].append(column)
+        return tables
+
+    def _load_postgresql_indexes(self, schema: str) -> dict[str, Any]:
+        """
+        Loads every relation's indexes in a schema with one query. Like
+        `get_indexes`, primary keys and expression-based indexes are left
+        out.
+        """
+
+        # Covering indexes (INCLUDE columns) are new in PostgreSQL 11.
+        covering = self.inspector.dialect.server_version_info >= (11,)
+        key_columns_sql = 'ix.indnkeyatts' if covering else 'NULL'
+        with self.inspector.bind.connect() as conn:
+            rows = conn.execute(sa.text(f"""
+                SELECT
+                    t.relname,
+                    i.relname,
+                    ix.indisunique,
+                    ix.indexprs IS NOT NULL,
+                    {key_columns_sql},
+                    k.ord,
+                    a.attname,
+                    ix.indoption[k.ord - 1],
+                    con.conname IS NOT NULL,
+                    am.amname,
+                    pg_catalog.pg_get_expr(ix.indpred, ix.indrelid)
+                FROM pg_catalog.pg_class t
+                JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+                LEFT JOIN pg_catalog.pg_index ix
+                    ON ix.indrelid = t.oid AND NOT ix.indisprimary
+                LEFT JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+                LEFT JOIN pg_catalog.pg_am am ON am.oid = i.relam
+                LEFT JOIN pg_catalog.pg_constraint con
+                    ON con.conrelid = ix.indrelid
+                    AND con.conindid = ix.indexrelid
+                    AND con.contype IN ('p', 'u', 'x')
+                LEFT JOIN LATERAL unnest(ix.indkey::int2[])
+                    WITH ORDINALITY AS k(attnum, ord) ON true
+                LEFT JOIN pg_catalog.pg_attribute a
+                    ON a.attrelid = t.oid AND a.attnum = k.attnum
+                WHERE n.nspname = :schema
+                    AND t.relkind IN ('r', 'v', 'm', 'f', 'p')
+                ORDER BY t.relname, i.relname, k.ord
+            """), {'schema': schema}).fetchall()
+        tables: dict[str, dict[str, dict[str, Any]]] = {}
+        for (
+            table,
+            name,
+            unique,
+            has_expressions,
+            key_columns,
+            ord,
+            column,
+            options,
+            duplicates_constraint,
+            amname,
+            where,
+        ) in rows:
+            indexes = tables.setdefault(table, {})
+            if name is None or has_expressions:
+                continue
+            index = indexes.get(name)
+            if index is None:
+                index = indexes[name] = {
+                    'name': name,
+                    'unique': unique,
+                    'column_names': [],
+                }
+                dialect_options = {}
+                if covering:
+                    index['include_columns'] = []
+                    dialect_options['postgresql_include'] = \
+                        index['include_columns']
+                if duplicates_constraint:
+                    index['duplicates_constraint'] = name
+                if amname and amname != 'btree':
+                    dialect_options['postgresql_using'] = amname
+                if where:
+                    dialect_options['postgresql_where'] = where
+                if dialect_options:
+                    index['dialect_options'] = dialect_options
+            if key_columns is not None and ord > key_columns:
+                index['include_columns'].append(column)
+            else:
+                index['column_names'].append(column)
+                # A bitmask: 0x01 is DESC, 0x02 is NULLS FIRST.
+                sorting = ()
+                if options and options & 0x01:
+                    sorting += ('desc',)
+                    if not options & 0x02:
+                        sorting += ('nulls_last',)
+                elif options and options & 0x02:
+                    sorting += ('nulls_first',)
+                if sorting:
+                    index.setdefault('column_sorting', {})[column] = sorting
+        return {
+            table: list(indexes.values())
+            for table, indexes in tables.items()
+        }
+
+    @classmethod
+    def for_engine(cls, engine: sa.engine.Engine) -> 'ReflectionCache':
+        """
+        :returns: The ReflectionCache for an engine. The cache lives as long
+            as the engine does, which is one crawl for engines shared with
+            `shared_engines`.
+        """
+
+        return engine_state(engine, 'reflection', lambda: cls(engine))
+
+
+class GrantCache:
+    """
+    Caches the privileges granted on tables, from
+    `information_schema.role_table_grants`. Grants are fetched for a whole
+    schema with one query, the first time one of its tables is looked up,
+    and the schema's other tables are answered from memory. The access
+    analyzer and the database browser's fingerprints share an engine's
+    GrantCache.
+    """
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        max_schemas: int = DEFAULT_REFLECTION_CACHE_SCHEMAS,
+    ):
+        self.engine = engine
+        # Schema -> table -> [(grantee, privilege_type)].
+        self.schemas = BoundedCache(max_schemas)
+
+    def get(self, schema: str, table: str) -> List[tuple[str, str]]:
+        """
+        :returns: (grantee, privilege_type) for every privilege granted on
+            a table.
+        """
+
+        return self._get_schema(schema).get(table, [])
+
+    def _get_schema(self, schema: str) -> dict[str, List[tuple[str, str]]]:
+        """
+        :returns: Grants for every table in a schema, keyed by table name.
+        """
+
+        # Only one thread fetches a schema; the others wait and use its grants.
+        return self.schemas.get_or_load(
+            schema,
+            lambda: self._load_schema(schema),
+        )
+
+    def _load_schema(self, schema: str) -> dict[str, List[tuple[str, str]]]:
+        grants: dict[str, List[tuple[str, str]]] = {}
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(sa.text(
+                    "SELECT table_name, grantee, privilege_type "
+                    "FROM information_schema.role_table_grants "
+                    "WHERE table_schema = :schema"
+                ), {'schema': schema})
+                for table, grantee, privilege_type in rows:
+                    grants.setdefault(table, []).append(
+                        (grantee, privilege_type),
+                    )
+        except Exception as e:
+            # TODO probably need a more tightly bound exception here
+            # We probably don't have access to the information_schema, so
+            # skip it. The empty result is cached, so we don't retry for
+            # every table in the schema.
+            log.debug(
+                'Unable to fetch access for schema=%s',
+                schema,
+                exc_info=e,
+            )
+        return grants
+
+    @classmethod
+    def for_engine(cls, engine: sa.engine.Engine) -> 'GrantCache':
+        """
+        :returns: The GrantCache for an engine. The cache lives as long as
+            the engine does.
+        """
+
+        return engine_state(engine, 'grants', lambda: cls(engine))
+
+
 class DatabaseBrowser(AbstractBrowser):
     """
     A browser that lists database objects. DatabaseBrowser uses SQLAlchemy and
@@ -47,23 +659,42 @@ class DatabaseBrowser(AbstractBrowser):
     def __init__(
         self,
         engine: sa.engine.Engine,
+        listing_page_size: int = DEFAULT_LISTING_PAGE_SIZE,
     ):
+        """
+        :param engine: The engine to list database objects with.
+        :param listing_page_size: Number of names to fetch per query, for
+            dialects that can page through listings (Snowflake).
+        """
+
+        assert listing_page_size > 0, \
+            f"Listing page size must be positive, got {listing_page_size}"
         self.url = str(engine.url)
         self.engine = engine
+        self.listing_page_size = listing_page_size
+        # (schema, table) -> last change marker, from the table's most
+        # recent fingerprint.
+        self.last_changes = BoundedCache(DEFAULT_LAST_CHANGE_CACHE_SIZE)
+
+    def children(self, path: PurePosixPath) -> Iterator[str]:
+        """
+        Lists a path's children. Tables and views are yielded as they're
+        fetched, so large schemas can be crawled before they've been listed
+        completely.
+        """
 
-    def children(self, path: PurePosixPath) -> List[str]:
         num_parts = len(path.parts)
         database_path = DatabasePath(path)
         # TODO Should use a lookup table here for better performance?
         if num_parts == 1:
             # /
-            return ['schemas']
+            return iter(['schemas'])
         elif num_parts == 2 and path.parts[1] == 'schemas':
             # /schemas
-            return self.schemas()
+            return iter(self.schemas())
         elif num_parts == 3:
             # /schemas/<some_schema>
-            return ['tables', 'views']
+            return iter(['tables', 'views'])
         elif num_parts == 4 and database_path.schema:
             if path.parts[3] == 'tables':
                 # /schemas/<some_schema>/tables
@@ -71,7 +702,7 @@ class DatabaseBrowser(AbstractBrowser):
             if path.parts[3] == 'views':
                 # /schemas/<some_schema>/views
                 return self.views(database_path.schema)
-        return []
+        return iter([])
 
     def schemas(self) -> List[str]:
         """
@@ -80,52 +711,45 @@ class DatabaseBrowser(AbstractBrowser):
             all database names.
         """
 
-        return sa.inspect(self.engine).get_schema_names()
+        with self.engine.connect() as conn:
+            return sa.inspect(conn).get_schema_names()
 
-    def tables(self, schema: str) -> List[str]:
+    def tables(self, schema: str) -> Iterator[str]:
         """
-        :returns: All table names in a schema.
+        :returns: An iterator over all table names in a schema.
         """
 
-        return self._tables_or_views(
-            schema,
-            sa.inspect(self.engine).get_table_names,
-        )
+        return self._tables_or_views(schema, 'tables')
 
-    def views(self, schema: str) -> List[str]:
+    def views(self, schema: str) -> Iterator[str]:
         """
-        :returns: All view names in a schema.
+        :returns: An iterator over all view names in a schema.
         """
-        return self._tables_or_views(
-            schema,
-            sa.inspect(self.engine).get_view_names,
-        )
+        return self._tables_or_views(schema, 'views')
 
     def _tables_or_views(
         self,
         schema: str,
-        get_method: Callable[[str], List[str]],
-    ) -> List[str]:
+        kind: str,
+    ) -> Iterator[str]:
         """
-        Helper function that gets returns all tables or views for a given
-        schema. This method exists because some DBs return `<schema>.<table>`
-        and others just return `<table>`. To keep things standard, we strip out
+        Helper function that yields all tables or views for a given schema.
+        This method exists because some DBs return `<schema>.<table>` and
+        others just return `<table>`. To keep things standard, we strip out
         the `<schema>.` prefix if it exists.
 
-        :param get_method: A SQLAlchemy inspection method; either
-            (`get_table_names` or `get_schema_names`).
-        :returns: All views or tables in a schema.
+        :param kind: Either `tables` or `views`.
+        :returns: An iterator over all views or tables in a schema.
         """
 
-        results = []
         try:
-            for table_or_view in get_method(schema):
+            for table_or_view in self._list_names(schema, kind):
                 # Stripe schema name from the table/view name. Some dialects
                 # include the schema name as part of the table/view. Let's keep
                 # things consistent.
                 if table_or_view.startswith(f"{schema}."):
                     table_or_view = table_or_view[len(schema) + 1:]
-                results.append(table_or_view)
+                yield table_or_view
         except Exception as e:
             # Just optimistically try, and ignore if we can't get info.
             # Easier than trying to figure out if permission exists.
@@ -134,7 +758,181 @@ class DatabaseBrowser(AbstractBrowser):
                 schema,
                 exc_info=e,
             )
-        return results
+
+    def _list_names(self, schema: str, kind: str) -> Iterator[str]:
+        """
+        Yields table or view names a page at a time on dialects that support
+        it, or all at once otherwise. A connection is only held while a page
+        is fetched, not while the names are consumed.
+        """
+
+        if self.engine.dialect.name == 'snowflake':
+            yield from self._show_names(schema, kind)
+            return
+        with self.engine.connect() as conn:
+            inspector = sa.inspect(conn)
+            if kind == 'tables':
+                names = inspector.get_table_names(schema)
+            else:
+                names = inspector.get_view_names(schema)
+        yield from names
+
+    def _show_names(self, schema: str, kind: str) -> Iterator[str]:
+        """
+        Pages through Snowflake's `SHOW TERSE TABLES` (or `VIEWS`) using
+        `LIMIT ... FROM`, which starts each page at the last name of the
+        previous one. Snowflake returns objects ordered by name.
+        """
+
+        dialect = self.engine.dialect
+        quoted_schema = dialect.identifier_preparer.quote_identifier(
+            dialect.denormalize_name(schema),
+        )
+        query = f"SHOW TERSE {kind.upper()} IN SCHEMA {quoted_schema} " \
+            f"LIMIT {self.listing_page_size}"
+        last_name = None
+        while True:
+            with self.engine.connect() as conn:
+                if last_name is None:
+                    rows = conn.execute(sa.text(query))
+                else:
+                    rows = conn.execute(
+                        sa.text(f"{query} FROM :last_name"),
+                        {'last_name': last_name},
+                    )
+                # Column 1 is the object's name.
+                names = [row[1] for row in rows]
+            for name in names:
+                # FROM may include the name it starts from.
+                if name != last_name:
+                    yield dialect.normalize_name(name)
+            if len(names) < self.listing_page_size:
+                return
+            last_name = names[-1]
+
+    def fingerprint(self, path: PurePosixPath) -> str | None:
+        """
+        Fingerprints tables and views using a hash of their reflected
+        columns, primary and foreign keys, indexes, comment, view definition,
+        and grants. Some databases also expose when a table was last changed
+        (or how many rows have been modified); that's included in the
+        fingerprint when available, so data changes are detected as well as
+        schema changes. See `fingerprints_data`.
+
+        :returns: A SHA-1 hex digest for tables and views. None otherwise.
+        """
+
+        database_path = DatabasePath(path)
+        schema = database_path.schema
+        table = database_path.table
+        if not schema or not table:
+            return None
+        reflection = ReflectionCache.for_engine(self.engine)
+        try:
+            columns = reflection.get('get_columns', table, schema)
+        except Exception as e:
+            log.debug(
+                'Unable to fingerprint table=%s.%s',
+                schema,
+                table,
+                exc_info=e,
+            )
+            return None
+        fingerprint = hashlib.sha1()
+        fingerprint.update(self._canonical(columns).encode())
+        methods = list(FINGERPRINT_REFLECTION_METHODS)
+        if path.parts[3] == 'views':
+            methods.append('get_view_definition')
+        for method in methods:
+            try:
+                result = reflection.get(method, table, schema)
+            except Exception as e:
+                # Not every dialect supports every method (e.g. comments).
+                log.debug(
+                    'Unable to fingerprint table=%s.%s with method=%s',
+                    schema,
+                    table,
+                    method,
+                    exc_info=e,
+                )
+                result = None
+            if isinstance(result, list):
+                # Indexes and foreign keys aren't reflected in a fixed order.
+                result = sorted(self._canonical(item) for item in result)
+            fingerprint.update(f"{method}={self._canonical(result)}".encode())
+        grants = sorted(GrantCache.for_engine(self.engine).get(schema, table))
+        fingerprint.update(f"grants={grants}".encode())
+        last_change = self._last_change(schema, table)
+        self.last_changes[(schema, table)] = last_change
+        fingerprint.update(str(last_change).encode())
+        return fingerprint.hexdigest()
+
+    def fingerprints_data(self, path: PurePosixPath) -> bool:
+        """
+        :returns: True if the dialect exposes a last-changed marker, and the
+            path's marker could be read, so its fingerprint changes when its
+            data changes. For other dialects (like SQLite), views, and tables
+            whose marker can't be read, only schema changes are detected.
+        """
+
+        if self.engine.dialect.name not in LAST_CHANGE_QUERIES:
+            return False
+        database_path = DatabasePath(path)
+        schema = database_path.schema
+        table = database_path.table
+        if not schema or not table:
+            return False
+        last_change = self.last_changes.get((schema, table), MISSING)
+        if last_change is MISSING:
+            # Not fingerprinted recently.
+            last_change = self._last_change(schema, table)
+        return last_change is not None
+
+    @staticmethod
+    def _canonical(value: Any) -> str:
+        """
+        :returns: A string for a reflection result that doesn't depend on
+            dictionary key order.
+        """
+
+        if isinstance(value, dict):
+            return repr(sorted(
+                (key, DatabaseBrowser._canonical(item))
+                for key, item in value.items()
+            ))
+        if isinstance(value, (list, tuple)):
+            return repr([DatabaseBrowser._canonical(item) for item in value])
+        return str(value)
+
+    def _last_change(self, schema: str, table: str) -> str | None:
+        """
+        :returns: A dialect-specific marker that changes when a table's data
+            or DDL changes, or None if the dialect doesn't have one or it
+            can't be read. Views don't have one, and MySQL's UPDATE_TIME is
+            NULL until a table is written after a restart.
+        """
+
+        query = LAST_CHANGE_QUERIES.get(self.engine.dialect.name)
+        if not query:
+            return None
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(
+                    sa.text(query),
+                    {'schema': schema, 'table': table},
+                ).first()
+                if not row or None in tuple(row):
+                    return None
+                return str(tuple(row))
+        except Exception as e:
+            log.warning(
+                'Unable to get last change for table=%s.%s; its data will '
+                'be analyzed in every incremental crawl',
+                schema,
+                table,
+                exc_info=e,
+            )
+            return None
 
     @staticmethod
     def root(**config) -> PurePosixPath:
@@ -161,4 +959,11 @@ class DatabaseBrowser(AbstractBrowser):
     def open(**config) -> Generator['DatabaseBrowser', None, None]:
         assert 'url' in config, \
             f"No url defined for browser config={config}"
-        yield DatabaseBrowser(sa.create_engine(config['url']))
+        engine = create_engine(
+            config['url'],
+            **config.get('engine', {}),
+        )
+        yield DatabaseBrowser(
+            engine,
+            config.get('listing_page_size', DEFAULT_LISTING_PAGE_SIZE),
+        )
@@ -40,6 +40,28 @@ class AbstractCatalog(ABC):
 
         raise NotImplementedError
 
+    def write_many(
+        self,
+        path: PurePosixPath,
+        metadata: dict[str, Any],
+    ) -> bool:
+        """
+        Writes several metadata types to a directory location at once.
+        Catalogs should override this method to write all types together
+        (e.g. as a single version of the directory's metadata). The default
+        implementation calls `write` once per type.
+
+        :param metadata: Metadata dictionary of the format
+            {"metadata_type": Any}.
+        :returns: False if the directory already had this metadata, so
+            nothing was written. True otherwise, or if the catalog can't
+            tell.
+        """
+
+        for type, type_metadata in metadata.items():
+            self.write(path, type, type_metadata)
+        return True
+
     @abstractmethod
     def rm(
         self,
@@ -55,6 +77,49 @@ class AbstractCatalog(ABC):
 
         raise NotImplementedError
 
+    def prune(
+        self,
+        children: dict[PurePosixPath, List[str]],
+    ):
+        """
+        Removes directories that are no longer listed by their parent. For
+        each parent path in `children`, any child in the catalog that isn't in
+        the parent's list is removed (along with its children and metadata).
+        Catalogs should override this method to reconcile all parents in bulk.
+        The default implementation calls `ls` and `rm` for each parent.
+
+        :param children: A dictionary of parent paths to the names of all of
+            their children.
+        """
+
+        for path, child_names in children.items():
+            catalog_children = self.ls(path) or []
+            for child in catalog_children:
+                if child not in child_names:
+                    self.rm(PurePosixPath(path, child))
+
+    def compact(
+        self,
+        keep_days: float | None = None,
+        keep_versions: int | None = None,
+    ) -> int:
+        """
+        Removes old versions of metadata. A version is only removed if it's
+        older than `keep_days` and isn't one of its directory's
+        `keep_versions` most recent versions, so `as_of` reads within the last
+        `keep_days` still return what they did before compacting. Catalogs
+        that don't keep history don't need to override this method; the
+        default implementation does nothing.
+
+        :param keep_days: Keep every version that was current at some point
+            in the last `keep_days` days.
+        :param keep_versions: Keep at least this many of each directory's most
+            recent versions.
+        :returns: The number of versions that were removed.
+        """
+
+        return 0
+
     @abstractmethod
     def ls(
         self,
@@ -71,6 +136,40 @@ class AbstractCatalog(ABC):
 
         raise NotImplementedError
 
+    def descendants(
+        self,
+        path: PurePosixPath,
+    ) -> List[PurePosixPath]:
+        """
+        Lists every directory below a path, recursively. Catalogs should
+        override this method to list a whole subtree at once. The default
+        implementation calls `ls` for each directory.
+
+        :returns: Descendant paths, ordered by depth, then by path.
+        """
+
+        descendants = []
+        level = [path]
+        while level:
+            next_level = []
+            for parent in level:
+                for child in self.ls(parent) or []:
+                    next_level.append(PurePosixPath(parent, child))
+            next_level.sort()
+            descendants.extend(next_level)
+            level = next_level
+        return descendants
+
+    def count(
+        self,
+        path: PurePosixPath,
+    ) -> int:
+        """
+        :returns: The number of directories below a path, recursively.
+        """
+
+        return len(self.descendants(path))
+
     @abstractmethod
     def read(
         self,
@@ -1,22 +1,69 @@
+import hashlib
+import json
+import logging
+import threading
 from .abstract import AbstractCatalog
+from collections import OrderedDict
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path, PurePosixPath
 from recap.config import RECAP_HOME, settings
-from sqlalchemy import Column, DateTime, create_engine, Index, select, update
+from sqlalchemy import (
+    case,
+    Column,
+    DateTime,
+    create_engine,
+    delete,
+    Index,
+    insert,
+    inspect,
+    MetaData,
+    or_,
+    select,
+    Table,
+    tuple_,
+    update,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.schema import Sequence
 from sqlalchemy.sql import func, text
 from sqlalchemy.types import BigInteger, Integer, String, JSON
-from typing import Any, Generator, List
+from typing import Any, Callable, Generator, List, TypeVar
 from urllib.parse import urlparse
 
 
+# Maximum number of paths to put in a single IN or OR clause. Keeps
+# statements well under database bind parameter limits (SQLite's is 999 in
+# older versions).
+BATCH_SIZE = 250
+# Number of parent directories to compact per transaction.
+COMPACT_BATCH_SIZE = 100
+# Maximum number of directories to remember as existing.
+DIRECTORY_CACHE_SIZE = 10000
+# Number of times to try a write whose new paths conflict with another
+# writer's.
+WRITE_ATTEMPTS = 3
 DEFAULT_URL = f"sqlite:///{settings('root_path', RECAP_HOME)}/catalog/recap.db"
 Base = declarative_base()
+log = logging.getLogger(__name__)
+T = TypeVar('T')
+
+
+def content_hash(metadata: Any) -> str:
+    """
+    :returns: A SHA-1 hex digest of a metadata value's canonical JSON (sorted
+        keys, no whitespace). Equal values always have equal hashes.
+    """
+
+    return hashlib.sha1(json.dumps(
+        metadata,
+        sort_keys=True,
+        separators=(',', ':'),
+    ).encode()).hexdigest()
 
 
 class CatalogEntry(Base):
@@ -44,6 +91,10 @@ class CatalogEntry(Base):
         index=True,
     )
     deleted_at = Column(DateTime)
+    # {type: payload id} for each metadata type in this version. Versions
+    # written before payloads existed have the whole document in metadata
+    # instead, and no payloads.
+    payloads = Column(JSON)
 
     __table_args__ = (
         Index(
@@ -53,26 +104,165 @@ class CatalogEntry(Base):
         ),
     )
 
-    def is_deleted(self) -> bool:
+    def is_deleted(self, as_of: datetime | None = None) -> bool:
+        if as_of and self.deleted_at:
+            return self.deleted_at <= as_of
         return self.deleted_at is not None
 
 
+class PayloadEntry(Base):
+    """
+    A single metadata type's value for a path. Versions in `catalog`
+    reference payloads by id, so a type that doesn't change between versions
+    is stored once rather than copied into every version.
+    """
+
+    __tablename__ = 'catalog_payloads'
+
+    payload_id_seq = Sequence('payload_id_seq')
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        payload_id_seq,
+        primary_key=True,
+    )
+    parent = Column(String(65535), nullable=False)
+    name = Column(String(4096), nullable=False)
+    type = Column(String(4096), nullable=False)
+    payload = Column(
+        JSON().with_variant(JSONB, "postgresql"),
+        nullable=False,
+    )
+    # The payload's content_hash.
+    hash = Column(String(40))
+
+    __table_args__ = (
+        Index(
+            'payload_parent_name_idx',
+            parent,
+            name,
+        ),
+    )
+
+
+# Reconstructed documents for `search` with `as_of`, so search queries can
+# run against whole documents.
+as_of_table = Table(
+    'catalog_as_of',
+    MetaData(),
+    Column('parent', String(65535)),
+    Column('name', String(4096)),
+    Column('metadata', JSON().with_variant(JSONB, "postgresql")),
+    prefixes=['TEMPORARY'],
+)
+
+
+class CurrentEntry(Base):
+    """
+    The most recent version of every path that hasn't been deleted. It's kept
+    in sync with `catalog` in the same transaction as every write and delete,
+    so present-time reads are primary key lookups instead of window functions
+    over the whole history.
+    """
+
+    __tablename__ = 'catalog_current'
+
+    parent = Column(String(65535), primary_key=True)
+    name = Column(String(4096), primary_key=True)
+    # The `catalog` row this version was copied from.
+    entry_id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        nullable=False,
+    )
+    metadata_ = Column(
+        'metadata',
+        JSON().with_variant(JSONB, "postgresql"),
+        nullable=False,
+    )
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        server_default=func.now(),
+    )
+    # {type: content_hash} for each metadata type in metadata. Null for
+    # entries that were copied from history and haven't been written since.
+    hashes = Column(JSON)
+    # The entry's full path (a materialized path), and how many levels below
+    # the root it is. Paths use a binary collation, so every path under
+    # `/a/b` sorts between `/a/b/` and `/a/b0`, and a subtree is a range scan
+    # on current_path_idx.
+    path = Column(
+        String(65535)
+        .with_variant(String(65535, collation='C'), 'postgresql')
+        .with_variant(String(65535, collation='utf8mb4_bin'), 'mysql'),
+    )
+    depth = Column(Integer)
+
+    __table_args__ = (
+        Index(
+            'current_path_idx',
+            path,
+        ),
+    )
+
+
 class DatabaseCatalog(AbstractCatalog):
     """
     DatabaseCatalog stores metadata entries in a `catalog` table using
-    SQLAlchemy. The table has three main columns: parent, name, and metadata.
+    SQLAlchemy. The table has three main columns: parent, name, and payloads.
     The parent and name columns reflect the directory for the metadata (as
-    defined by an AbstractBrowser). The metadata column contains a JSON blob of
-    all the various metadata types and objects.
+    defined by an AbstractBrowser). The payloads column maps each metadata
+    type to a row in `catalog_payloads`, which holds the type's JSON value.
 
     Previous metadata versions are kept in `catalog` as well. A deleted_at
     field is used to tombstone deleted directories. Directories that were
     updated, not deleted, will not have a deleted_at set; there will just be a
-    more recent row (as sorted by `id`).
+    more recent row (as sorted by `id`). A new version only adds payloads for
+    the types that changed, and references the previous version's payloads
+    for the rest, so a crawl that only changes a table's profile doesn't copy
+    its columns. Documents are reconstructed from their payloads when history
+    is read. Versions written by older versions of Recap keep the whole
+    document in the metadata column, and are read as is.
 
     Reads return the most recent metadata that was written to the path. If the
     most recent record has a deleted_at tombstone, an None is returned.
 
+    The latest version of every live path is also kept in a
+    `catalog_current` table, which is updated in the same transaction as
+    `catalog`. Present-time `ls`, `read`, and `search` only look at
+    `catalog_current`, so they don't slow down as history accumulates.
+    History is only scanned for `as_of` queries. An `as_of` search runs in
+    SQL against `catalog_current` for versions that are still current, and
+    only reconstructs the documents of versions that have since been
+    replaced or deleted.
+
+    Every metadata type's content hash is kept alongside the current version,
+    so a write that doesn't change anything (the common case when
+    re-crawling) is decided by comparing hashes from a primary key lookup,
+    without loading the current document.
+
+    Writes are serialized with a lock, so a single DatabaseCatalog can be
+    shared by concurrent crawler threads. Without the lock, threads that touch
+    the same parent directories race each other (and SQLite catalogs fail
+    with lock timeouts). Catalogs in other processes (other crawls, or other
+    Recap servers) can still create the same path at the same time. The
+    loser's insert fails on `catalog_current`'s primary key, and its
+    transaction is retried, at which point it sees the path and updates it.
+
+    Each write is a single transaction that creates any missing parent
+    directories and writes the metadata. Directories that are known to exist
+    are remembered (up to DIRECTORY_CACHE_SIZE of them), so most writes during
+    a crawl don't check their parents at all. The cache is cleared whenever
+    paths are deleted. Directories deleted by another process aren't noticed
+    until then, so their children can be written without recreating them.
+
+    `catalog_current` also stores each path's full path and depth. Removing
+    a subtree, counting it, and listing it recursively are range scans on
+    the full path's index, rather than pattern matches on `parent`.
+
+    Old versions can be removed with `compact`. It works through the history
+    a batch of directories at a time, each in its own short transaction, so
+    it can run against a catalog that's being crawled.
+
     Search strings are simply passed along to the WHERE clause in a SELECT
     statement. This does leave room for SQL injection attacks; not thrilled
     about that.
@@ -84,49 +274,23 @@ class DatabaseCatalog(AbstractCatalog):
     ):
         self.engine = engine
         Base.metadata.create_all(engine)
+        self._add_missing_columns()
+        self._add_missing_indexes()
         self.Session = sessionmaker(engine)
+        self.write_lock = threading.RLock()
+        # Directories that are known to exist, in least recently used order.
+        self.directories: OrderedDict[str, None] = OrderedDict()
+        self._backfill_current()
+        self._backfill_paths()
 
     def touch(
         self,
         path: PurePosixPath,
     ):
         path = PurePosixPath('/', path)
-        path_stack = list(path.parts)
-        cwd = '/'
-
-        with self.Session() as session, session.begin():
-            # Touch all parents to make sure they exist.
-            while len(path_stack):
-                cwd = PurePosixPath(cwd, *path_stack)
-
-                # PurePosixPath('/').parts returns ('/',). We don't want to touch
-                # the root because it doesn't fit the parent/name model that we
-                # have.
-                if len(cwd.parts) > 1:
-                    maybe_row = session.scalar(
-                        select(
-                            CatalogEntry,
-                        )
-                        .filter(
-                            CatalogEntry.parent == str(cwd.parent),
-                            CatalogEntry.name == str(cwd.name),
-                        ).order_by(
-                            CatalogEntry.id.desc(),
-                        )
-                    )
-
-                    if not maybe_row or maybe_row.is_deleted():
-                        session.add(CatalogEntry(
-                            parent=str(cwd.parent),
-                            name=cwd.name,
-                            metadata_={},
-                        ))
-                    else:
-                        # Path exists and isn't deleted. We can assume all
-                        # parents also exist, so no need to check.
-                        break
-
-                path_stack.pop()
+        with self.write_lock:
+            touched = self._transaction(self._touch, path)
+            self._remember_directories(touched)
 
     def write(
         self,
@@ -134,18 +298,28 @@ class DatabaseCatalog(AbstractCatalog):
         type: str,
         metadata: Any,
     ):
+        self.write_many(path, {type: metadata})
+
+    def write_many(
+        self,
+        path: PurePosixPath,
+        metadata: dict[str, Any],
+    ) -> bool:
         path = PurePosixPath('/', path)
-        self.touch(path)
-        with self.Session() as session, session.begin():
-            existing_doc = self._get_metadata(session, path) or {}
-            # Only update if there's something new.
-            if existing_doc.get(type) != metadata:
-                updated_doc = existing_doc | {type: metadata}
-                session.add(CatalogEntry(
-                    parent=str(path.parent),
-                    name=path.name,
-                    metadata_=updated_doc,
-                ))
+        hashes = {
+            type: content_hash(type_metadata)
+            for type, type_metadata in metadata.items()
+        }
+        with self.write_lock:
+            touched, written = self._transaction(
+                self._write_many,
+                path,
+                metadata,
+                hashes,
+            )
+            # Only remember directories once they've been committed.
+            self._remember_directories(touched + [path])
+        return written
 
     def rm(
         self,
@@ -154,25 +328,102 @@ class DatabaseCatalog(AbstractCatalog):
     ):
         path = PurePosixPath('/', path)
         if not type:
-            with self.Session() as session:
-                session.execute(update(CatalogEntry).where(
-                    (
-                        CatalogEntry.parent.match(f"{path}%")
-                    ) | (
-                        CatalogEntry.parent == str(path.parent),
-                        CatalogEntry.name == path.name,
-                    )
-                ).values(deleted_at = func.now()))
+            with self.write_lock, self.Session() as session, session.begin():
+                self._tombstone(session, [path])
         else:
-            with self.Session() as session, session.begin():
-                doc = self._get_metadata(session, path)
-                if doc:
+            with self.write_lock, self.Session() as session, session.begin():
+                current = self._get_current(session, path, for_update=True)
+                if current and current.metadata_:
+                    # Copy, so the ORM sees a new value.
+                    doc = dict(current.metadata_)
                     doc.pop(type, None)
-                    session.add(CatalogEntry(
-                        parent=str(path.parent),
-                        name=path.name,
-                        metadata_=doc,
+                    self._add_entry(
+                        session,
+                        path,
+                        doc,
+                        self._hashes(doc, current.hashes or {}),
+                        current,
+                    )
+
+    def prune(
+        self,
+        children: dict[PurePosixPath, List[str]],
+    ):
+        children = {
+            str(PurePosixPath('/', path)): set(child_names)
+            for path, child_names in children.items()
+        }
+        parents = list(children.keys())
+        with self.write_lock, self.Session() as session, session.begin():
+            missing = []
+            # Find all current children of all parents with one query per
+            # batch, rather than one `ls` per parent.
+            for i in range(0, len(parents), BATCH_SIZE):
+                query = select(
+                    CurrentEntry.parent,
+                    CurrentEntry.name,
+                ).where(
+                    CurrentEntry.parent.in_(parents[i:i + BATCH_SIZE]),
+                )
+                for parent, name in session.execute(query):
+                    if name not in children[parent]:
+                        missing.append(PurePosixPath(parent, name))
+            self._tombstone(session, missing)
+
+    def compact(
+        self,
+        keep_days: float | None = None,
+        keep_versions: int | None = None,
+    ) -> int:
+        assert keep_days is not None or keep_versions is not None, \
+            'Compaction requires keep_days, keep_versions, or both'
+        assert keep_days is None or keep_days >= 0, \
+            f"keep_days must not be negative, got {keep_days}"
+        assert keep_versions is None or keep_versions > 0, \
+            f"keep_versions must be positive, got {keep_versions}"
+        cutoff = None
+        if keep_days is not None:
+            # Use the database's clock, since it sets created_at.
+            with self.Session() as session:
+                now = session.scalar(select(func.now()))
+            cutoff = now - timedelta(days=keep_days)
+        removed = 0
+        last_parent = None
+        while True:
+            with self.Session() as session:
+                query = select(
+                    CatalogEntry.parent,
+                ).distinct().order_by(
+                    CatalogEntry.parent,
+                ).limit(COMPACT_BATCH_SIZE)
+                if last_parent is not None:
+                    query = query.where(CatalogEntry.parent > last_parent)
+                parents = session.scalars(query).all()
+            if not parents:
+                break
+            last_parent = parents[-1]
+            with self.write_lock, self.Session() as session, session.begin():
+                ids = session.scalars(self._compactable(
+                    parents,
+                    cutoff,
+                    keep_versions,
+                )).all()
+                for i in range(0, len(ids), BATCH_SIZE):
+                    session.execute(delete(CatalogEntry).where(
+                        CatalogEntry.id.in_(ids[i:i + BATCH_SIZE]),
+                    ).execution_options(
+                        synchronize_session=False,
                     ))
+                if ids:
+                    self._remove_unused_payloads(session, parents)
+            removed += len(ids)
+            log.debug(
+                'Compacted parents through=%s removed=%s',
+                last_parent,
+                removed,
+            )
+        log.info('Compacted catalog removed=%s', removed)
+        return removed
 
     def ls(
         self,
@@ -181,6 +432,13 @@ class DatabaseCatalog(AbstractCatalog):
     ) -> List[str] | None:
         path = PurePosixPath('/', path)
         with self.Session() as session:
+            if not as_of:
+                rows = session.execute(select(
+                    CurrentEntry.name,
+                ).where(
+                    CurrentEntry.parent == str(path),
+                )).fetchall()
+                return [row[0] for row in rows] or None
             subquery = session.query(
                 CatalogEntry.name,
                 CatalogEntry.deleted_at,
@@ -193,15 +451,45 @@ class DatabaseCatalog(AbstractCatalog):
                 ).label('rnk')
             ).filter(
                 CatalogEntry.parent == str(path),
-                CatalogEntry.created_at <= (as_of or func.now()),
+                CatalogEntry.created_at <= as_of,
             ).subquery()
             query = session.query(subquery).filter(
                 subquery.c.rnk == 1,
-                subquery.c.deleted_at == None,
+                self._live_as_of(subquery.c.deleted_at, as_of),
             )
             rows = session.execute(query).fetchall()
             return [row[0] for row in rows] or None
 
+    def descendants(
+        self,
+        path: PurePosixPath,
+    ) -> List[PurePosixPath]:
+        path = PurePosixPath('/', path)
+        with self.Session() as session:
+            rows = session.execute(select(
+                CurrentEntry.path,
+            ).where(
+                self._subtree(path, descendants_only=True),
+            ).order_by(
+                CurrentEntry.depth,
+                CurrentEntry.path,
+            )).fetchall()
+            return [PurePosixPath(row[0]) for row in rows]
+
+    def count(
+        self,
+        path: PurePosixPath,
+    ) -> int:
+        path = PurePosixPath('/', path)
+        with self.Session() as session:
+            return session.scalar(select(
+                func.count(),
+            ).select_from(
+                CurrentEntry,
+            ).where(
+                self._subtree(path, descendants_only=True),
+            ))
+
     def read(
         self,
         path: PurePosixPath,
@@ -217,8 +505,20 @@ class DatabaseCatalog(AbstractCatalog):
         as_of: datetime | None = None,
     ) -> List[dict[str, Any]]:
         with self.Session() as session:
-            subquery = session.query(
-                CatalogEntry.metadata_,
+            if not as_of:
+                rows = session.execute(select(
+                    CurrentEntry.metadata_,
+                ).where(
+                    # TODO Yikes. Pretty sure this is a SQL injection
+                    # vulnerability.
+                    text(query),
+                )).fetchall()
+                return [row[0] for row in rows]
+            subquery = select(
+                CatalogEntry.id,
+                CatalogEntry.parent,
+                CatalogEntry.name,
+                CatalogEntry.payloads,
                 CatalogEntry.deleted_at,
                 func.rank().over(
                     order_by=CatalogEntry.id.desc(),
@@ -227,20 +527,703 @@ class DatabaseCatalog(AbstractCatalog):
                         CatalogEntry.name,
                     )
                 ).label('rnk')
-            ).filter(
-                CatalogEntry.created_at <= (as_of or func.now()),
-                # TODO Yikes. Pretty sure this is a SQL injection vulnerability.
-                text(query)
+            ).where(
+                CatalogEntry.created_at <= as_of,
             ).subquery()
-
-            query = session.query(subquery).filter(
+            versions = select(subquery).where(
                 subquery.c.rnk == 1,
-                subquery.c.deleted_at == None,
-            ) # pyright: ignore [reportGeneralTypeIssues]
+                self._live_as_of(subquery.c.deleted_at, as_of),
+            ).subquery()
+            # Versions that are still current have the same document in
+            # catalog_current, and versions written before payloads existed
+            # have the whole document in catalog, so both are searched with
+            # SQL. Subqueries are only used in IN clauses, so the query's
+            # column names aren't ambiguous.
+            rows = session.execute(select(
+                CurrentEntry.metadata_,
+            ).where(
+                CurrentEntry.entry_id.in_(select(versions.c.id)),
+                # TODO Yikes. Pretty sure this is a SQL injection
+                # vulnerability.
+                text(query),
+            )).fetchall()
+            replaced = select(
+                versions,
+            ).outerjoin(
+                CurrentEntry,
+                CurrentEntry.entry_id == versions.c.id,
+            ).where(
+                CurrentEntry.entry_id == None,
+            ).subquery()
+            rows += session.execute(select(
+                CatalogEntry.metadata_,
+            ).where(
+                CatalogEntry.id.in_(select(replaced.c.id).where(
+                    replaced.c.payloads == None,
+                )),
+                text(query),
+            )).fetchall()
+            # Only the rest, which have changed or been deleted since, need
+            # to be reconstructed from their payloads.
+            replaced_versions = session.execute(select(
+                replaced.c.parent,
+                replaced.c.name,
+                replaced.c.payloads,
+            ).where(
+                replaced.c.payloads != None,
+            )).fetchall()
+            docs = []
+            for i in range(0, len(replaced_versions), BATCH_SIZE):
+                batch = replaced_versions[i:i + BATCH_SIZE]
+                docs.extend(zip(batch, self._load_documents(
+                    session,
+                    [(None, row.payloads) for row in batch],
+                )))
+        if docs:
+            rows += self._search_documents(query, [
+                (row.parent, row.name, doc)
+                for row, doc in docs
+            ])
+        return [row[0] for row in rows]
 
-            rows = session.execute(query).fetchall()
+    def _search_documents(
+        self,
+        query: str,
+        docs: List[tuple[str, str, dict[str, Any]]],
+    ) -> List[Any]:
+        """
+        Runs a search query against reconstructed documents, by loading them
+        into a temporary table.
+
+        :param docs: (parent, name, document) tuples.
+        :returns: Matching rows.
+        """
+
+        with self.engine.connect() as conn:
+            transaction = conn.begin()
+            try:
+                as_of_table.create(conn)
+                for i in range(0, len(docs), BATCH_SIZE):
+                    conn.execute(insert(as_of_table), [
+                        {'parent': parent, 'name': name, 'metadata': doc}
+                        for parent, name, doc in docs[i:i + BATCH_SIZE]
+                    ])
+                rows = conn.execute(select(
+                    as_of_table.c.metadata,
+                ).where(
+                    # TODO Yikes. Pretty sure this is a SQL injection
+                    # vulnerability.
+                    text(query),
+                )).fetchall()
+            except Exception:
+                # On PostgreSQL, nothing (not even the DROP) can run in a
+                # transaction after a statement fails, so roll back first.
+                # That drops the table on PostgreSQL, but not on SQLite,
+                # where CREATE TABLE isn't part of the transaction.
+                transaction.rollback()
+                as_of_table.drop(conn, checkfirst=True)
+                raise
+            as_of_table.drop(conn)
+            transaction.commit()
+            return rows
+
+    def _transaction(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Calls `fn(session, *args)` in a transaction, and commits it. If the
+        commit fails because another writer created one of the same paths
+        first, the transaction is retried with a new session.
+        """
+
+        attempt = 1
+        while True:
+            try:
+                with self.Session() as session, session.begin():
+                    return fn(session, *args)
+            except IntegrityError:
+                if attempt >= WRITE_ATTEMPTS:
+                    raise
+                log.debug(
+                    'Retrying write after a conflicting write attempt=%s',
+                    attempt,
+                    exc_info=True,
+                )
+                attempt += 1
+
+    def _write_many(
+        self,
+        session: Session,
+        path: PurePosixPath,
+        metadata: dict[str, Any],
+        hashes: dict[str, str],
+    ) -> tuple[List[PurePosixPath], bool]:
+        """
+        Writes metadata types to a path, unless they haven't changed.
+
+        :param hashes: The content hash of every type in metadata.
+        :returns: The path's touched parents, and whether anything was
+            written.
+        """
+
+        # Only touch the parents. The path itself is created below, so a new
+        # path gets a single row rather than an empty row followed by a
+        # metadata row.
+        touched = self._touch(session, path.parent)
+        current_hashes = session.execute(select(
+            CurrentEntry.hashes,
+        ).where(
+            CurrentEntry.parent == str(path.parent),
+            CurrentEntry.name == path.name,
+        )).first()
+        if (
+            current_hashes
+            and current_hashes[0] is not None
+            and all(
+                current_hashes[0].get(type) == hash
+                for type, hash in hashes.items()
+            )
+        ):
+            # Nothing changed, so there's no need to load the document.
+            return touched, False
+        current = self._get_current(session, path, for_update=True)
+        existing_doc = current.metadata_ if current else None
+        updated_doc = (existing_doc or {}) | metadata
+        known_hashes = (current and current.hashes or {}) | hashes
+        updated_hashes = self._hashes(updated_doc, known_hashes)
+        # Only update if there's something new.
+        if existing_doc is None or existing_doc != updated_doc:
+            self._add_entry(
+                session,
+                path,
+                updated_doc,
+                updated_hashes,
+                current,
+            )
+            return touched, True
+        if current.hashes is None:
+            current.hashes = updated_hashes
+        return touched, False
+
+    def _tombstone(
+        self,
+        session: Session,
+        paths: List[PurePosixPath],
+    ):
+        """
+        Marks paths and all of their descendants as deleted.
+        """
+
+        # Each path needs three bind parameters.
+        batch_size = BATCH_SIZE // 3
+        for i in range(0, len(paths), batch_size):
+            batch = paths[i:i + batch_size]
+            subtrees = or_(*[self._subtree(path) for path in batch])
+            # Every live version of a path in the subtree. Older versions
+            # were tombstoned when their path was last deleted.
+            session.execute(update(CatalogEntry).where(
+                CatalogEntry.deleted_at == None,
+                tuple_(
+                    CatalogEntry.parent,
+                    CatalogEntry.name,
+                ).in_(select(
+                    CurrentEntry.parent,
+                    CurrentEntry.name,
+                ).where(
+                    subtrees,
+                )),
+            ).values(
+                deleted_at=func.now(),
+            ).execution_options(
+                synchronize_session=False,
+            ))
+            result = session.execute(delete(CurrentEntry).where(
+                subtrees,
+            ).execution_options(
+                synchronize_session=False,
+            ))
+            if result.rowcount:
+                self._forget_directories(batch)
+
+    @staticmethod
+    def _subtree(path: PurePosixPath, descendants_only: bool = False) -> Any:
+        """
+        :param descendants_only: Exclude the path itself.
+        :returns: A condition that matches a path and all of its descendants
+            in `catalog_current`, as a range scan on the full path.
+        """
+
+        prefix = str(path).rstrip('/') + '/'
+        # '0' is the character after '/'.
+        descendants = (CurrentEntry.path >= prefix) \
+            & (CurrentEntry.path < f"{prefix[:-1]}0")
+        if descendants_only:
+            return descendants
+        return or_(CurrentEntry.path == str(path), descendants)
+
+    def _remove_unused_payloads(self, session: Session, parents: List[str]):
+        """
+        Removes payloads under `parents` that no version references anymore.
+        """
+
+        used = set()
+        for (manifest,) in session.execute(select(
+            CatalogEntry.payloads,
+        ).where(
+            CatalogEntry.parent.in_(parents),
+            CatalogEntry.payloads != None,
+        )):
+            used.update(manifest.values())
+        unused = [
+            payload_id
+            for payload_id in session.scalars(select(
+                PayloadEntry.id,
+            ).where(
+                PayloadEntry.parent.in_(parents),
+            ))
+            if payload_id not in used
+        ]
+        for i in range(0, len(unused), BATCH_SIZE):
+            session.execute(delete(PayloadEntry).where(
+                PayloadEntry.id.in_(unused[i:i + BATCH_SIZE]),
+            ).execution_options(
+                synchronize_session=False,
+            ))
+
+    @staticmethod
+    def _compactable(
+        parents: List[str],
+        cutoff: datetime | None,
+        keep_versions: int | None,
+    ) -> Any:
+        """
+        :returns: A query for the ids of versions under `parents` that can be
+            removed. Versions created before the cutoff are removed unless
+            they're among a path's `keep_versions` most recent versions, or
+            they're the version that was still current at the cutoff. Versions
+            of paths that were deleted before the cutoff aren't kept at all.
+        """
+
+        partition_by = (CatalogEntry.parent, CatalogEntry.name)
+        version = func.row_number().over(
+            order_by=CatalogEntry.id.desc(),
+            partition_by=partition_by,
+        ).label('version')
+        if cutoff is None:
+            subquery = select(
+                CatalogEntry.id,
+                version,
+            ).where(
+                CatalogEntry.parent.in_(parents),
+            ).subquery()
+            return select(subquery.c.id).where(
+                subquery.c.version > keep_versions,
+            )
+        subquery = select(
+            CatalogEntry.id,
+            CatalogEntry.created_at,
+            CatalogEntry.deleted_at,
+            version,
+            # 1 for the most recent version created before the cutoff.
+            func.row_number().over(
+                order_by=CatalogEntry.id.desc(),
+                partition_by=(
+                    *partition_by,
+                    case((CatalogEntry.created_at < cutoff, 1), else_=0),
+                ),
+            ).label('cutoff_version'),
+        ).where(
+            CatalogEntry.parent.in_(parents),
+        ).subquery()
+        deleted_before_cutoff = subquery.c.deleted_at < cutoff
+        conditions = [
+            subquery.c.created_at < cutoff,
+            # The version that was current at the cutoff is needed for as_of
+            # reads in the retention window, unless it had been deleted.
+            or_(subquery.c.cutoff_version > 1, deleted_before_cutoff),
+        ]
+        if keep_versions is not None:
+            conditions.append(or_(
+                subquery.c.version > keep_versions,
+                deleted_before_cutoff,
+            ))
+        return select(subquery.c.id).where(*conditions)
+
+    @staticmethod
+    def _live_as_of(deleted_at: Any, as_of: datetime) -> Any:
+        """
+        :returns: A condition for rows that hadn't been deleted yet at as_of.
+            Tombstones are set on existing rows, so a row deleted after as_of
+            was still live then.
+        """
 
-            return [row[0] for row in rows]
+        return or_(deleted_at == None, deleted_at > as_of)
+
+    def _touch(
+        self,
+        session: Session,
+        path: PurePosixPath,
+    ) -> List[PurePosixPath]:
+        """
+        Creates a path and its ancestors if they don't exist. Ancestors that
+        aren't known to exist are looked up with a single query, and missing
+        ones are inserted together.
+
+        :returns: The path and its ancestors, all of which will exist once
+            the session commits.
+        """
+
+        # PurePosixPath('/').parts returns ('/',). We don't want to touch the
+        # root because it doesn't fit the parent/name model that we have.
+        paths = [p for p in [path, *path.parents] if len(p.parts) > 1]
+        unknown = [p for p in paths if str(p) not in self.directories]
+        if unknown:
+            existing = set()
+            for i in range(0, len(unknown), BATCH_SIZE // 2):
+                batch = unknown[i:i + BATCH_SIZE // 2]
+                existing.update(session.execute(select(
+                    CurrentEntry.parent,
+                    CurrentEntry.name,
+                ).where(
+                    CurrentEntry.parent.in_({str(p.parent) for p in batch}),
+                    CurrentEntry.name.in_({p.name for p in batch}),
+                )))
+            missing = [
+                p for p in reversed(unknown)
+                if (str(p.parent), p.name) not in existing
+            ]
+            self._add_entries(
+                session,
+                [(p, {}, {}, None) for p in missing],
+            )
+        return paths
+
+    def _remember_directories(self, paths: List[PurePosixPath]):
+        for path in paths:
+            key = str(path)
+            self.directories[key] = None
+            self.directories.move_to_end(key)
+        while len(self.directories) > DIRECTORY_CACHE_SIZE:
+            self.directories.popitem(last=False)
+
+    def _forget_directories(self, paths: List[PurePosixPath]):
+        # Evict the paths and everything under them, but leave the rest of
+        # the cache alone.
+        prefixes = tuple(f"{str(path).rstrip('/')}/" for path in paths)
+        for key in [
+            key for key in self.directories
+            if f"{key}/".startswith(prefixes)
+        ]:
+            del self.directories[key]
+
+    def _get_current(
+        self,
+        session: Session,
+        path: PurePosixPath,
+        for_update: bool = False,
+    ) -> CurrentEntry | None:
+        """
+        :param for_update: Lock the entry until the session commits, so
+            writers in other processes can't update it in the meantime and
+            have their changes overwritten.
+        """
+
+        return session.get(
+            CurrentEntry,
+            (str(path.parent), path.name),
+            with_for_update=for_update,
+        )
+
+    def _add_entry(
+        self,
+        session: Session,
+        path: PurePosixPath,
+        doc: dict[str, Any],
+        hashes: dict[str, str],
+        current: CurrentEntry | None = None,
+    ):
+        """
+        Appends a new version of a path to the history, and makes it the
+        path's current version.
+
+        :param hashes: The content hash of every type in doc.
+        :param current: The path's current entry, if it has one.
+        """
+
+        self._add_entries(session, [(path, doc, hashes, current)])
+
+    def _add_entries(
+        self,
+        session: Session,
+        docs: List[tuple[
+            PurePosixPath,
+            dict[str, Any],
+            dict[str, str],
+            CurrentEntry | None,
+        ]],
+    ):
+        """
+        Appends new versions of several paths to the history, and makes them
+        the paths' current versions. Only types that changed since a path's
+        current version get new payloads.
+
+        :param docs: (path, document, content hashes, current entry) tuples.
+            The current entry is None for new paths.
+        """
+
+        if not docs:
+            return
+        previous_ids = [
+            current.entry_id
+            for _, _, _, current in docs
+            if current
+        ]
+        previous_payloads = {}
+        for i in range(0, len(previous_ids), BATCH_SIZE):
+            previous_payloads.update(session.execute(select(
+                CatalogEntry.id,
+                CatalogEntry.payloads,
+            ).where(
+                CatalogEntry.id.in_(previous_ids[i:i + BATCH_SIZE]),
+            )).all())
+        manifests = []
+        new_payloads = []
+        for path, doc, hashes, current in docs:
+            manifest = {}
+            previous_doc = current.metadata_ if current else {}
+            previous_hashes = current and current.hashes
+            previous_manifest = previous_payloads.get(
+                current.entry_id if current else None,
+            ) or {}
+            for type, metadata in doc.items():
+                if previous_hashes is not None:
+                    unchanged = previous_hashes.get(type) == hashes[type]
+                else:
+                    unchanged = type in previous_doc \
+                        and previous_doc[type] == metadata
+                if type in previous_manifest and unchanged:
+                    manifest[type] = previous_manifest[type]
+                else:
+                    new_payloads.append((manifest, type, PayloadEntry(
+                        parent=str(path.parent),
+                        name=path.name,
+                        type=type,
+                        payload=metadata,
+                        hash=hashes[type],
+                    )))
+            manifests.append(manifest)
+        session.add_all([payload for _, _, payload in new_payloads])
+        # Assigns the payloads' ids.
+        session.flush()
+        for manifest, type, payload in new_payloads:
+            manifest[type] = payload.id
+        entries = [
+            CatalogEntry(
+                parent=str(path.parent),
+                name=path.name,
+                metadata_={},
+                payloads=manifest,
+            )
+            for (path, _, _, _), manifest in zip(docs, manifests)
+        ]
+        session.add_all(entries)
+        # Assigns the entries' ids.
+        session.flush()
+        for entry, (_, doc, hashes, current) in zip(entries, docs):
+            if current:
+                current.entry_id = entry.id
+                current.metadata_ = doc
+                current.hashes = hashes
+                current.created_at = func.now()
+            else:
+                path = PurePosixPath(entry.parent, entry.name)
+                session.add(CurrentEntry(
+                    parent=entry.parent,
+                    name=entry.name,
+                    entry_id=entry.id,
+                    metadata_=doc,
+                    hashes=hashes,
+                    path=str(path),
+                    depth=len(path.parts) - 1,
+                ))
+
+    @staticmethod
+    def _hashes(
+        doc: dict[str, Any],
+        known_hashes: dict[str, str],
+    ) -> dict[str, str]:
+        """
+        :returns: The content hash of every type in doc. Hashes in
+            known_hashes are reused rather than recomputed.
+        """
+
+        return {
+            type: known_hashes[type] if type in known_hashes
+            else content_hash(metadata)
+            for type, metadata in doc.items()
+        }
+
+    def _load_documents(
+        self,
+        session: Session,
+        versions: List[tuple[Any, dict[str, int] | None]],
+    ) -> List[dict[str, Any]]:
+        """
+        Reconstructs the documents for versions in the history.
+
+        :param versions: (metadata, payloads) tuples for each version.
+        :returns: Each version's document.
+        """
+
+        payload_ids = [
+            payload_id
+            for _, manifest in versions
+            for payload_id in (manifest or {}).values()
+        ]
+        payloads = {}
+        for i in range(0, len(payload_ids), BATCH_SIZE):
+            payloads.update(session.execute(select(
+                PayloadEntry.id,
+                PayloadEntry.payload,
+            ).where(
+                PayloadEntry.id.in_(payload_ids[i:i + BATCH_SIZE]),
+            )).all())
+        return [
+            {
+                type: payloads[payload_id]
+                for type, payload_id in manifest.items()
+            }
+            if manifest is not None
+            # Written before payloads existed.
+            else metadata
+            for metadata, manifest in versions
+        ]
+
+    def _backfill_paths(self):
+        """
+        Fills in full paths and depths for `catalog_current` entries that
+        were written before they existed.
+        """
+
+        while True:
+            with self.write_lock, self.Session() as session, session.begin():
+                rows = session.execute(select(
+                    CurrentEntry.parent,
+                    CurrentEntry.name,
+                ).where(
+                    CurrentEntry.path == None,
+                ).limit(BATCH_SIZE)).fetchall()
+                if not rows:
+                    return
+                for parent, name in rows:
+                    path = PurePosixPath(parent, name)
+                    session.execute(update(CurrentEntry).where(
+                        CurrentEntry.parent == parent,
+                        CurrentEntry.name == name,
+                    ).values(
+                        path=str(path),
+                        depth=len(path.parts) - 1,
+                    ))
+
+    def _add_missing_columns(self):
+        """
+        Adds columns that were introduced after a catalog's tables were
+        created. New columns are always nullable.
+        """
+
+        inspector = inspect(self.engine)
+        for table in Base.metadata.sorted_tables:
+            existing = {
+                column['name']
+                for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=self.engine.dialect)
+                log.info(
+                    'Adding column=%s to table=%s',
+                    column.name,
+                    table.name,
+                )
+                with self.engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    ))
+
+    def _add_missing_indexes(self):
+        """
+        Creates indexes that were introduced after a catalog's tables were
+        created. `create_all` skips tables that already exist, indexes
+        included.
+        """
+
+        inspector = inspect(self.engine)
+        for table in Base.metadata.sorted_tables:
+            existing = {
+                index['name']
+                for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                log.info(
+                    'Adding index=%s to table=%s',
+                    index.name,
+                    table.name,
+                )
+                index.create(self.engine)
+
+    def _backfill_current(self):
+        """
+        Fills `catalog_current` from the history for catalogs that were
+        created before it existed.
+        """
+
+        with self.write_lock, self.Session() as session, session.begin():
+            if (
+                session.scalar(select(CurrentEntry.parent).limit(1))
+                is not None
+                or session.scalar(select(CatalogEntry.id).limit(1)) is None
+            ):
+                return
+            subquery = select(
+                CatalogEntry.parent,
+                CatalogEntry.name,
+                CatalogEntry.id,
+                CatalogEntry.metadata_,
+                CatalogEntry.created_at,
+                CatalogEntry.deleted_at,
+                CatalogEntry.payloads,
+                func.rank().over(
+                    order_by=CatalogEntry.id.desc(),
+                    partition_by=(
+                        CatalogEntry.parent,
+                        CatalogEntry.name,
+                    )
+                ).label('rnk')
+            ).subquery()
+            session.execute(insert(CurrentEntry).from_select(
+                [
+                    CurrentEntry.parent,
+                    CurrentEntry.name,
+                    CurrentEntry.entry_id,
+                    CurrentEntry.metadata_,
+                    CurrentEntry.created_at,
+                ],
+                select(
+                    subquery.c.parent,
+                    subquery.c.name,
+                    subquery.c.id,
+                    subquery.c.metadata_,
+                    subquery.c.created_at,
+                ).where(
+                    subquery.c.rnk == 1,
+                    subquery.c.deleted_at == None,
+                    # Versions with payloads were written after
+                    # catalog_current existed, so they're already in it.
+                    subquery.c.payloads == None,
+                ),
+            ))
 
     def _get_metadata(
         self,
@@ -248,19 +1231,25 @@ class DatabaseCatalog(AbstractCatalog):
         path: PurePosixPath,
         as_of: datetime | None = None,
     ) -> Any | None:
+        if not as_of:
+            current = self._get_current(session, path)
+            return current.metadata_ if current else None
         maybe_entry = session.scalar(
             select(
                 CatalogEntry,
             ).where(
                 CatalogEntry.parent == str(path.parent),
                 CatalogEntry.name == path.name,
-                CatalogEntry.created_at <= (as_of or func.now()),
+                CatalogEntry.created_at <= as_of,
             ).order_by(
                 CatalogEntry.id.desc(),
             )
         )
-        if maybe_entry and not maybe_entry.is_deleted():
-            return maybe_entry.metadata_
+        if maybe_entry and not maybe_entry.is_deleted(as_of):
+            return self._load_documents(
+                session,
+                [(maybe_entry.metadata_, maybe_entry.payloads)],
+            )[0]
         else:
             return None
 
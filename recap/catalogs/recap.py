@@ -17,6 +17,9 @@ class RecapCatalog(AbstractCatalog):
         client: httpx.Client,
     ):
         self.client = client
+        # Whether the server writes metadata without a type. Unknown until
+        # the first write_many.
+        self.server_writes_many: bool | None = None
 
     def touch(
         self,
@@ -33,6 +36,23 @@ class RecapCatalog(AbstractCatalog):
         params = {'type': type} if type else None
         self.client.put(str(path), params=params, json=metadata)
 
+    def write_many(
+        self,
+        path: PurePosixPath,
+        metadata: dict[str, Any],
+    ) -> bool:
+        if self.server_writes_many is not False:
+            written = self.client.put(str(path), json=metadata).json()
+            # Newer servers say whether anything was written.
+            if isinstance(written, bool):
+                self.server_writes_many = True
+                return written
+            # Older servers only touch the path, and drop the metadata.
+            self.server_writes_many = False
+        for type, type_metadata in metadata.items():
+            self.write(path, type, type_metadata)
+        return True
+
     def rm(
         self,
         path: PurePosixPath,
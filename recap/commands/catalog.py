@@ -4,6 +4,7 @@ from recap import catalogs
 from recap.config import settings
 from rich import print_json
 from pathlib import PurePosixPath
+from typing import Optional
 
 
 app = typer.Typer(help="Read and search the data catalog.")
@@ -36,13 +37,24 @@ def list_(
         help=\
             "View metadata as of a point in time.",
     ),
+    recursive: bool = typer.Option(
+        False, '--recursive', '-r',
+        help=\
+            "List all descendants' paths, not just children.",
+    ),
 ):
     """
     Lists a data catalog directory's children.
     """
 
+    if recursive and as_of:
+        raise typer.BadParameter('--recursive does not support --as-of.')
+
     with catalogs.open(**settings('catalog', {})) as c:
-        results = sorted(c.ls(PurePosixPath(path), as_of) or [])
+        if recursive:
+            results = list(map(str, c.descendants(PurePosixPath(path))))
+        else:
+            results = sorted(c.ls(PurePosixPath(path), as_of) or [])
         print_json(data=results)
 
 
@@ -62,3 +74,38 @@ def read(
     with catalogs.open(**settings('catalog', {})) as c:
         results = c.read(PurePosixPath(path), as_of) or []
         print_json(data=results, sort_keys=True)
+
+
+@app.command()
+def compact(
+    keep_days: Optional[float] = typer.Option(
+        None, '--keep-days', '-d',
+        help=\
+            "Keep every version that was current in the last N days.",
+    ),
+    keep_versions: Optional[int] = typer.Option(
+        None, '--keep-versions', '-k',
+        min=1,
+        help=\
+            "Keep at least each path's N most recent versions.",
+    ),
+):
+    """
+    Removes old metadata versions from the data catalog. Options default to
+    the catalog's `retention` settings.
+    """
+
+    catalog_settings = settings('catalog', {})
+    retention = catalog_settings.get('retention', {})
+    if keep_days is None:
+        keep_days = retention.get('keep_days')
+    if keep_versions is None:
+        keep_versions = retention.get('keep_versions')
+    if keep_days is None and keep_versions is None:
+        raise typer.BadParameter(
+            'Set --keep-days, --keep-versions, or catalog retention settings.',
+        )
+
+    with catalogs.open(**catalog_settings) as c:
+        removed = c.compact(keep_days, keep_versions)
+        print_json(data={'removed': removed})
@@ -1,11 +1,27 @@
+import json
+import logging
+import time
 import typer
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from recap.catalogs.abstract import AbstractCatalog
 from recap.config import settings
 from recap.crawler import Crawler
+from recap.metrics import CrawlMetrics
 from recap import catalogs
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from typing import List, Optional
+from rich import print
+from rich.progress import (
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TimeElapsedColumn,
+)
+from rich.table import Table
+from typing import Any, List, Optional
+from urllib.parse import urlparse
 
 
+log = logging.getLogger(__name__)
 app = typer.Typer()
 
 
@@ -26,6 +42,32 @@ def crawl(
         help=\
             "Crawl only certain paths. Format is Unix shell-style wildcards.",
     ),
+    workers: Optional[int] = typer.Option(
+        None, '--workers', '-w',
+        help=\
+            "Number of paths to crawl concurrently for each instance.",
+    ),
+    incremental: bool = typer.Option(
+        False, '--incremental', '-i',
+        help=\
+            "Skip analyzing tables that haven't changed since the last crawl.",
+    ),
+    resume: bool = typer.Option(
+        False, '--resume', '-r',
+        help=\
+            "Resume an interrupted crawl from its last checkpoint.",
+    ),
+    concurrency: int = typer.Option(
+        1, '--concurrency', '-c',
+        min=1,
+        help=\
+            "Number of instances to crawl concurrently.",
+    ),
+    report: Optional[Path] = typer.Option(
+        None, '--report',
+        help=\
+            "Write a JSON report of crawl timings and counters to this file.",
+    ),
 ):
     """
     Crawls infrastructure and writes metadata to the data catalog.
@@ -54,24 +96,143 @@ def crawl(
             if not url or url == crawler_config['url']:
                 crawler_config['filters'] = path_filters
 
-    with catalogs.open(**settings('catalog', {})) as catalog:
+    if workers:
+        for crawler_config in crawlers_configs:
+            if not url or url == crawler_config['url']:
+                crawler_config['workers'] = workers
+
+    if incremental:
         for crawler_config in crawlers_configs:
             if not url or url == crawler_config['url']:
-                with Crawler.open(
-                    catalog,
-                    **crawler_config,
-                ) as crawler:
-                    spinner = SpinnerColumn(finished_text='[green]✓')
-                    text = TextColumn("[progress.description]{task.description}")
-
-                    with (Progress(spinner, text) as progress):
-                        # Set up the spinner description.
-                        task_id = progress.add_task(
-                            description=f"Crawling {crawler.root} ...",
-                            total=1,
-                        )
-
-                        crawler.crawl()
-
-                        # Mark done, so we get a little green checkmark.
-                        progress.update(task_id, completed=1)
+                crawler_config['incremental'] = incremental
+
+    if resume:
+        for crawler_config in crawlers_configs:
+            if not url or url == crawler_config['url']:
+                crawler_config['resume'] = resume
+
+    crawlers_configs = [
+        crawler_config
+        for crawler_config in crawlers_configs
+        if not url or url == crawler_config['url']
+    ]
+    spinner = SpinnerColumn(finished_text='[green]✓')
+    text = TextColumn("[progress.description]{task.description}")
+    elapsed = TimeElapsedColumn()
+
+    catalog_settings = settings('catalog', {})
+    retention = catalog_settings.get('retention', {})
+
+    with (
+        catalogs.open(**catalog_settings) as catalog,
+        Progress(spinner, text, elapsed) as progress,
+        ThreadPoolExecutor(max_workers=concurrency) as executor,
+    ):
+        futures = [
+            executor.submit(_crawl_instance, catalog, progress, crawler_config)
+            for crawler_config in crawlers_configs
+        ]
+        results = [future.result() for future in futures]
+
+        if retention.get('compact_after_crawl'):
+            task_id = progress.add_task(
+                description='Compacting catalog ...',
+                total=1,
+            )
+            try:
+                catalog.compact(
+                    retention.get('keep_days'),
+                    retention.get('keep_versions'),
+                )
+            except Exception as e:
+                log.warning('Unable to compact catalog', exc_info=e)
+            progress.update(task_id, completed=1)
+
+    summary = Table('Instance', 'Status', 'Duration')
+    for result in results:
+        status = '[red]failed' if result['error'] else '[green]ok'
+        summary.add_row(
+            result['instance'],
+            status,
+            f"{result['duration']:.1f}s",
+        )
+    print(summary)
+
+    slowest_paths = sorted(
+        (
+            (path['seconds'], result['instance'], path['path'])
+            for result in results
+            for path in result['metrics']['slowest_paths']
+        ),
+        reverse=True,
+    )[:10]
+    if slowest_paths:
+        slowest = Table('Instance', 'Path', 'Duration', title='Slowest paths')
+        for seconds, instance, path in slowest_paths:
+            slowest.add_row(instance, path, f"{seconds:.2f}s")
+        print(slowest)
+
+    if report:
+        report.write_text(json.dumps(results, indent=2))
+
+    if any(result['error'] for result in results):
+        raise typer.Exit(code=1)
+
+
+def _crawl_instance(
+    catalog: AbstractCatalog,
+    progress: Progress,
+    crawler_config: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Crawls a single instance and reports its status in a progress row. Errors
+    are logged rather than raised, so one failing instance doesn't stop the
+    others from being crawled.
+
+    :returns: A summary with the instance's name, crawl duration in seconds,
+        error (None if the crawl succeeded), and the crawler's metrics report.
+    """
+
+    # Don't show credentials in the progress rows or summary.
+    instance = urlparse(crawler_config['url']).netloc.split('@')[-1]
+    task_id = progress.add_task(
+        description=f"Connecting to {instance} ...",
+        total=1,
+    )
+    start = time.monotonic()
+    error = None
+    metrics = CrawlMetrics().report()
+
+    try:
+        with Crawler.open(
+            catalog,
+            **crawler_config,
+        ) as crawler:
+            instance = str(crawler.root)
+            progress.update(
+                task_id,
+                description=f"Crawling {instance} ...",
+            )
+
+            try:
+                crawler.crawl()
+            finally:
+                metrics = crawler.metrics.report()
+
+            # Mark done, so we get a little green checkmark.
+            progress.update(task_id, completed=1)
+    except Exception as e:
+        log.exception('Crawl failed for instance=%s', instance)
+        progress.update(
+            task_id,
+            description=f"[red]Failed {instance}",
+        )
+        progress.stop_task(task_id)
+        error = str(e) or type(e).__name__
+
+    return {
+        'instance': instance,
+        'duration': time.monotonic() - start,
+        'error': error,
+        'metrics': metrics,
+    }
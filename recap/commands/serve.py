@@ -1,8 +1,9 @@
 import typer
+from contextlib import ExitStack
 from datetime import datetime
 from fastapi import Body, Depends, FastAPI
 from pathlib import PurePosixPath
-from typing import Any, List, Generator
+from typing import Any, List
 from recap import catalogs
 from recap.catalogs.abstract import AbstractCatalog
 from recap.config import settings
@@ -11,13 +12,35 @@ from recap.logging import setup_logging
 
 DEFAULT_URL = 'http://localhost:8000'
 
+# Keeps the server's catalog open between startup and shutdown.
+catalog_stack = ExitStack()
+
+
+def open_catalog():
+    """
+    Opens the catalog once per server process. Every request shares it, so
+    the catalog's write lock and caches apply to the whole server, and the
+    catalog's tables aren't checked and upgraded on every request.
+    """
+
+    fastapp.state.catalog = catalog_stack.enter_context(
+        catalogs.open(**settings('catalog', {})),
+    )
+
+
+def close_catalog():
+    catalog_stack.close()
+
+
 app = typer.Typer()
-fastapp = FastAPI()
+fastapp = FastAPI(
+    on_startup=[open_catalog],
+    on_shutdown=[close_catalog],
+)
 
 
-def get_catalog() -> Generator[AbstractCatalog, None, None]:
-    with catalogs.open(**settings('catalog', {})) as c:
-        yield c
+def get_catalog() -> AbstractCatalog:
+    return fastapp.state.catalog
 
 
 # WARN This must go before get_path since get_path is a catch-all.
@@ -55,6 +78,9 @@ def put_path(
 ):
     if type and metadata:
         catalog.write(PurePosixPath(path), type, metadata)
+    elif metadata:
+        # No type, so metadata is a {"metadata_type": Any} dictionary.
+        return catalog.write_many(PurePosixPath(path), metadata)
     else:
         return catalog.touch(PurePosixPath(path))
 
@@ -1,17 +1,31 @@
-import fnmatch
+import hashlib
+import json
 import logging
+import os
+import queue
+import threading
+import time
+from .config import RECAP_HOME, settings
+from .engines import shared_engines
+from .filters import PathFilter
+from .metrics import CrawlMetrics
 from .plugins import load_analyzer_plugins, load_browser_plugins
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager, ExitStack
-from pathlib import PurePosixPath
+from pathlib import Path, PurePosixPath
 from recap.analyzers.abstract import AbstractAnalyzer
 from recap.browsers.abstract import AbstractBrowser
 from recap.catalogs.abstract import AbstractCatalog
-from typing import Any, Generator, List
+from typing import Any, Callable, Generator, List
 
 
 log = logging.getLogger(__name__)
 
 
+# Number of children a worker lists before handing them off to be crawled.
+CHILDREN_BATCH_SIZE = 100
+
+
 class Crawler:
     """
     Crawler does three things:
@@ -22,6 +36,36 @@ class Crawler:
 
     Recap's crawler is very simple right now. The crawler recursively browses
     and analyzes all children starting from an infrastructre's root location.
+
+    Paths are crawled on a thread pool. Each path is a unit of work: it's
+    analyzed, its metadata is written, and its children are listed and
+    submitted back to the pool. Children are submitted in batches while
+    they're listed, so the first tables in a large schema are crawled before
+    the whole schema has been listed. Siblings are independent of each other,
+    so they can be crawled concurrently.
+
+    Incremental crawls skip analyzing paths whose browser fingerprint hasn't
+    changed since the last crawl. The fingerprint is stored in the catalog as
+    `fingerprint` metadata alongside the analyzers' metadata.
+
+    The crawler periodically checkpoints its frontier (paths that still need
+    to be crawled) and completed paths to a JSON file. If a crawl dies, the
+    next crawl can resume from the checkpoint instead of starting over. The
+    checkpoint is deleted when a crawl finishes.
+
+    Children that have been deleted from the infrastructure are removed from
+    the catalog in bulk. The crawler remembers every directory listing it
+    sees, and periodically asks the catalog to prune all children that are
+    missing from those listings.
+
+    Every crawl collects timings and counters in `metrics`: per analyzer, per
+    browser and catalog call, and per path. See CrawlMetrics.report().
+
+    Analyzers are run as a dependency graph. An analyzer that consumes a
+    metadata type (like `columns`) runs after the analyzers that produce it,
+    and receives their results. With more than one `analyzer_workers`,
+    analyzers that don't depend on each other run concurrently, so a path
+    takes as long as its slowest chain of analyzers rather than all of them.
     """
 
     def __init__(
@@ -31,6 +75,12 @@ class Crawler:
         catalog: AbstractCatalog,
         analyzers: List[AbstractAnalyzer],
         filters: List[str] = [],
+        workers: int = 1,
+        incremental: bool = False,
+        checkpoint_path: Path | None = None,
+        checkpoint_interval: float = 60,
+        resume: bool = False,
+        analyzer_workers: int = 1,
     ):
         """
         :param root: Root path to use when storing data in the catalog.
@@ -40,152 +90,494 @@ class Crawler:
         :param filters: Path filter to include only certain paths. Recap uses
             Unix filename pattern matching as defined in Python's fnmatch
             module. The path that's filtered doesn't include the root.
+        :param workers: Maximum number of paths to crawl concurrently.
+        :param incremental: Skip analyzers for paths whose fingerprint matches
+            the fingerprint stored in the catalog.
+        :param checkpoint_path: File to checkpoint crawl progress to. No
+            checkpoints are written if unset.
+        :param checkpoint_interval: Minimum number of seconds between
+            checkpoints.
+        :param resume: Resume from the checkpoint, if one exists.
+        :param analyzer_workers: Maximum number of analyzers to run
+            concurrently, across all paths.
         """
 
+        assert workers > 0, f"Crawler workers must be positive, got {workers}"
+        assert analyzer_workers > 0, \
+            f"Crawler analyzer workers must be positive, got {analyzer_workers}"
+
         self.root = root
         self.browser = browser
         self.catalog = catalog
         self.analyzers = analyzers
         self.filters = filters
-        self.exploded_filters = self._explode_filters(filters)
+        self.path_filter = PathFilter(filters)
+        self.workers = workers
+        self.incremental = incremental
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.analyzer_workers = analyzer_workers
+        # Indexes of the analyzers that each analyzer depends on.
+        self.dependencies = [
+            [
+                index
+                for index, producer in enumerate(analyzers)
+                if producer is not analyzer
+                and set(producer.produces) & set(analyzer.consumes)
+            ]
+            for analyzer in analyzers
+        ]
+        self.analyzer_order = self._sort_analyzers()
+        self.analyzer_executor: ThreadPoolExecutor | None = None
+        self.listings: dict[PurePosixPath, List[str]] = {}
+        self.listings_lock = threading.Lock()
+        self.metrics = CrawlMetrics()
 
     def crawl(self):
-        log.info('Beginning crawl root=%s', self.root)
-        self.catalog.touch(self.root)
-        # Start crawling from the root ('/')
-        path_stack: List[PurePosixPath] = [PurePosixPath('/')]
-
-        while len(path_stack) > 0:
-            path = path_stack.pop()
-            log.info("Crawling path=%s", path)
-
-            # 1. Read and save metadata for path if filters match.
-            if self._matches(path, self.filters):
-                metadata = self._get_metadata(path)
-                self._write_metadata(path, metadata)
-
-            # 2. Add children (that match filter) to path_stack.
-            children = self.browser.children(path)
-            children_paths = map(
-                lambda c: PurePosixPath(path, c),
-                children,
-            )
-            children_paths = filter(
-                lambda p: self._matches(p, self.exploded_filters),
-                children_paths,
-            )
-            path_stack.extend(children_paths)
-
-            # 3. Remove deleted children from catalog.
-            self._remove_deleted(path, children)
+        log.info('Beginning crawl root=%s workers=%s', self.root, self.workers)
+        with self.metrics.timer('catalog.touch'):
+            self.catalog.touch(self.root)
+
+        # Start crawling from the root ('/'), unless we're resuming.
+        frontier: set[PurePosixPath] = {PurePosixPath('/')}
+        completed: set[PurePosixPath] = set()
+        if self.resume:
+            frontier, completed = self._load_checkpoint() \
+                or (frontier, completed)
+        last_checkpoint = time.monotonic()
+
+        # Workers report the children they find, and the paths they finish,
+        # as events. Children are reported in batches while they're listed,
+        # so they're crawled before their parent's listing is complete.
+        events: queue.SimpleQueue = queue.SimpleQueue()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+            ThreadPoolExecutor(
+                max_workers=self.analyzer_workers,
+            ) as analyzer_executor:
+            self.analyzer_executor = analyzer_executor
+            pending: dict[Future, PurePosixPath] = {}
+
+            def submit(path: PurePosixPath):
+                future = executor.submit(
+                    self._crawl_path,
+                    path,
+                    lambda children: events.put(('children', children)),
+                )
+                pending[future] = path
+                future.add_done_callback(
+                    lambda future: events.put(('done', future)),
+                )
+
+            for path in frontier:
+                submit(path)
+
+            try:
+                while pending:
+                    event, value = events.get()
+                    if event == 'children':
+                        for child_path in value:
+                            if (
+                                child_path not in completed
+                                and child_path not in frontier
+                            ):
+                                frontier.add(child_path)
+                                submit(child_path)
+                    else:
+                        # A path's children are always reported before it's
+                        # done, so its children are in the frontier by now.
+                        value.result()
+                        path = pending.pop(value)
+                        frontier.discard(path)
+                        completed.add(path)
+                    if (
+                        time.monotonic() - last_checkpoint
+                        >= self.checkpoint_interval
+                    ):
+                        self._remove_deleted()
+                        self._save_checkpoint(frontier, completed)
+                        last_checkpoint = time.monotonic()
+            except:
+                # Don't keep crawling queued paths if one of them failed.
+                for future in pending:
+                    future.cancel()
+                try:
+                    self._remove_deleted()
+                except Exception as e:
+                    log.warning(
+                        'Unable to remove deleted paths for root=%s',
+                        self.root,
+                        exc_info=e,
+                    )
+                    # Deleted children of these paths haven't been removed
+                    # yet, so list them again when resuming.
+                    with self.listings_lock:
+                        unpruned = set(self.listings.keys())
+                    frontier = frontier | unpruned
+                    completed = completed - unpruned
+                self._save_checkpoint(frontier, completed)
+                raise
+
+        self._remove_deleted()
+
+        if self.checkpoint_path:
+            self.checkpoint_path.unlink(missing_ok=True)
 
         log.info('Finished crawl root=%s', self.root)
 
-    def _matches(
+    def _save_checkpoint(
+        self,
+        frontier: set[PurePosixPath],
+        completed: set[PurePosixPath],
+    ):
+        """
+        Atomically writes the crawl's frontier and completed paths to the
+        checkpoint file.
+        """
+
+        if not self.checkpoint_path:
+            return
+        log.debug(
+            'Checkpointing crawl root=%s frontier=%s completed=%s',
+            self.root,
+            len(frontier),
+            len(completed),
+        )
+        checkpoint = {
+            'root': str(self.root),
+            'filters': list(self.filters),
+            'frontier': sorted(map(str, frontier)),
+            'completed': sorted(map(str, completed)),
+        }
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(checkpoint))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _load_checkpoint(
+        self,
+    ) -> tuple[set[PurePosixPath], set[PurePosixPath]] | None:
+        """
+        Reads the crawl's checkpoint file. Checkpoints for a different root or
+        different filters are ignored.
+
+        :returns: A (frontier, completed) tuple, or None if there's no
+            checkpoint to resume from.
+        """
+
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            log.info('No checkpoint to resume from for root=%s', self.root)
+            return None
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if (
+            checkpoint.get('root') != str(self.root)
+            or checkpoint.get('filters') != list(self.filters)
+        ):
+            log.warning(
+                'Ignoring checkpoint=%s that was written by a different crawl',
+                self.checkpoint_path,
+            )
+            return None
+        log.info(
+            'Resuming crawl root=%s from checkpoint=%s',
+            self.root,
+            self.checkpoint_path,
+        )
+        return (
+            set(map(PurePosixPath, checkpoint['frontier'])),
+            set(map(PurePosixPath, checkpoint['completed'])),
+        )
+
+    def _crawl_path(
         self,
         path: PurePosixPath,
-        filters: List[str],
-    ) -> bool:
+        discovered: Callable[[List[PurePosixPath]], None],
+    ):
         """
-        Check if a path matches any filters.
+        Crawl a single path. This is the unit of work that crawl() submits to
+        its thread pool.
 
-        :returns: True if path matches a filter or if filters is empty.
+        :param discovered: Called with batches of the path's children that
+            should be crawled next, as they're listed.
         """
 
-        for filter in filters:
-            if fnmatch.fnmatch(str(path), filter):
-                return True
-        return False if filters else True
+        log.info("Crawling path=%s", path)
+        self.metrics.increment('paths.crawled')
+
+        # 1. Read and save metadata for path if filters match.
+        if self.path_filter.matches(path):
+            start = time.perf_counter()
+            metadata = self._get_metadata(path)
+            self._write_metadata(path, metadata)
+            self.metrics.record_path(str(path), time.perf_counter() - start)
+
+        # 2. Prune the subtree if no descendant can match the filters.
+        if not self.path_filter.may_match_descendant(path):
+            return
+
+        # 3. Find children that match the filter, or might have descendants
+        # that do, and hand them off as they're listed.
+        children = []
+        batch = []
+        with self.metrics.timer('browser.children'):
+            for child in self.browser.children(path):
+                children.append(child)
+                child_path = PurePosixPath(path, child)
+                if (
+                    self.path_filter.matches(child_path)
+                    or self.path_filter.may_match_descendant(child_path)
+                ):
+                    batch.append(child_path)
+                if len(batch) >= CHILDREN_BATCH_SIZE:
+                    discovered(batch)
+                    batch = []
+        if batch:
+            discovered(batch)
+
+        # 4. Remember the children, so deleted ones can be removed from the
+        # catalog.
+        with self.listings_lock:
+            self.listings[path] = children
 
     def _get_metadata(
         self,
         path: PurePosixPath,
     ) -> dict[str, Any]:
         """
-        Run all analyzers on a path.
+        Run all analyzers on a path. In incremental mode, analyzers are
+        skipped if the path's fingerprint hasn't changed, except for
+        analyzers that read data when the browser's fingerprint doesn't
+        track data changes. Incremental analyzers are given the path's
+        existing metadata to update.
 
         :returns: A dictionary of all metadata returned from all analyzers.
+            Empty if the path is unchanged.
         """
 
         results = {}
-        for analyzer in self.analyzers:
-            log.debug(
-                'Analyzing path=%s analyzer=%s',
-                path,
-                type(analyzer).__name__,
-            )
-            results |= analyzer.analyze(path)
+        existing_doc = {}
+        selected = None
+        fingerprint = self._fingerprint(path) if self.incremental else None
+        if fingerprint or any(a.incremental for a in self.analyzers):
+            full_path = PurePosixPath(self.root, str(path)[1:])
+            with self.metrics.timer('catalog.read'):
+                existing_doc = self.catalog.read(full_path) or {}
+        if fingerprint and existing_doc.get('fingerprint') == fingerprint:
+            self.metrics.increment('paths.unchanged')
+            selected = set()
+            if not self.browser.fingerprints_data(path):
+                selected = {
+                    index
+                    for index, analyzer in enumerate(self.analyzers)
+                    if analyzer.reads_data
+                }
+            if not selected:
+                log.debug('Skipping unchanged path=%s', path)
+                return results
+            log.debug('Analyzing data for unchanged path=%s', path)
+        # Merge in list order, so results don't depend on timing.
+        for analyzer_results in self._run_analyzers(
+            path,
+            existing_doc,
+            selected,
+        ):
+            results |= analyzer_results or {}
+        if fingerprint:
+            results['fingerprint'] = fingerprint
         return results
 
-    def _write_metadata(
+    def _run_analyzers(
         self,
         path: PurePosixPath,
-        metadata: dict[str, Any],
-    ):
+        previous: dict[str, Any],
+        selected: set[int] | None = None,
+    ) -> List[dict[str, Any] | None]:
         """
-        Write a metadata dictionary to a path in the catalog.
+        Runs analyzers on a path in dependency order. Analyzers are run as
+        soon as the analyzers they depend on finish, on the analyzer thread
+        pool if there is more than one analyzer worker.
+
+        :param selected: Indexes of the analyzers to run, or None to run all
+            of them. The analyzers they depend on are run too.
+        :returns: Each analyzer's metadata, in the same order as `analyzers`.
+            None for analyzers that weren't run.
         """
 
-        full_path = PurePosixPath(self.root, str(path)[1:])
+        order = self.analyzer_order
+        if selected is not None:
+            required = set()
+            pending_indexes = list(selected)
+            while pending_indexes:
+                index = pending_indexes.pop()
+                if index not in required:
+                    required.add(index)
+                    pending_indexes.extend(self.dependencies[index])
+            order = [index for index in order if index in required]
+        results: List[dict[str, Any] | None] = [None] * len(self.analyzers)
+        if self.analyzer_workers == 1 or not self.analyzer_executor:
+            for index in order:
+                results[index] = self._run_analyzer(
+                    index,
+                    path,
+                    previous,
+                    results,
+                )
+            return results
+
+        remaining = list(order)
+        pending = {}
+        try:
+            while remaining or pending:
+                for index in list(remaining):
+                    if all(
+                        results[dependency] is not None
+                        for dependency in self.dependencies[index]
+                    ):
+                        remaining.remove(index)
+                        future = self.analyzer_executor.submit(
+                            self._run_analyzer,
+                            index,
+                            path,
+                            previous,
+                            results,
+                        )
+                        pending[future] = index
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        except:
+            for future in pending:
+                future.cancel()
+            raise
+        return results
 
-        # TODO Should have AbstractCatalog.write allow for multiple type dicts
-        for type, metadata in metadata.items():
-            log.debug(
-                'Writing metadata path=%s type=%s',
-                full_path,
-                type,
-            )
-            self.catalog.write(full_path, type, metadata)
+    def _run_analyzer(
+        self,
+        index: int,
+        path: PurePosixPath,
+        previous: dict[str, Any],
+        results: List[dict[str, Any] | None],
+    ) -> dict[str, Any]:
+        analyzer = self.analyzers[index]
+        analyzer_name = type(analyzer).__name__
+        upstream = {}
+        for dependency in self.dependencies[index]:
+            upstream |= results[dependency] or {}
+        log.debug(
+            'Analyzing path=%s analyzer=%s',
+            path,
+            analyzer_name,
+        )
+        with self.metrics.timer(f"analyzer.{analyzer_name}"):
+            return analyzer.analyze_with(path, upstream, previous)
+
+    def _sort_analyzers(self) -> List[int]:
+        """
+        :returns: Analyzer indexes, sorted so every analyzer comes after the
+            analyzers it depends on. Analyzers whose dependencies are
+            satisfied at the same point keep their list order.
+        """
+
+        order: List[int] = []
+        remaining = list(range(len(self.analyzers)))
+        while remaining:
+            ready = [
+                index
+                for index in remaining
+                if all(
+                    dependency in order
+                    for dependency in self.dependencies[index]
+                )
+            ]
+            assert ready, \
+                'Analyzers have a dependency cycle: ' + ', '.join(
+                    type(self.analyzers[index]).__name__
+                    for index in remaining
+                )
+            order.extend(ready)
+            remaining = [index for index in remaining if index not in ready]
+        return order
+
+    def _fingerprint(self, path: PurePosixPath) -> str | None:
+        """
+        Combines the browser's fingerprint for a path with the analyzers that
+        are configured, so adding or excluding an analyzer invalidates
+        existing fingerprints.
+
+        :returns: A fingerprint string, or None if the browser doesn't support
+            fingerprinting the path.
+        """
+
+        with self.metrics.timer('browser.fingerprint'):
+            browser_fingerprint = self.browser.fingerprint(path)
+        if not browser_fingerprint:
+            return None
+        fingerprint = hashlib.sha1(browser_fingerprint.encode())
+        for analyzer in self.analyzers:
+            fingerprint.update(type(analyzer).__qualname__.encode())
+        return fingerprint.hexdigest()
 
-    def _remove_deleted(
+    def _write_metadata(
         self,
         path: PurePosixPath,
-        instance_children: List[str],
+        metadata: dict[str, Any],
     ):
         """
-        Compares the path's children in the browser vs. what is currently in
-        the catalog. Deletes all children that appear in the catalog, but no
-        longer appear in the browser. This behavior removes children that used
-        to exist in data infrastructure, but have been deleted since the last
-        crawl.
+        Write a metadata dictionary to a path in the catalog.
         """
 
         full_path = PurePosixPath(self.root, str(path)[1:])
-        catalog_children = self.catalog.ls(full_path) or []
-        # Find catalog children that are not in the browser's children.
-        deleted_children = [s for s in catalog_children if s not in instance_children]
-        for child in deleted_children:
-            path_to_remove = PurePosixPath(full_path, child)
-            log.debug('Removing deleted path from catalog: %s', path_to_remove)
-            self.catalog.rm(path_to_remove)
 
-    def _explode_filters(self, filters: List[str]) -> List[str]:
+        if metadata:
+            log.debug(
+                'Writing metadata path=%s types=%s',
+                full_path,
+                list(metadata.keys()),
+            )
+            with self.metrics.timer('catalog.write_many'):
+                written = self.catalog.write_many(full_path, metadata)
+            if written:
+                self.metrics.increment('catalog.paths_written')
+                self.metrics.increment(
+                    'catalog.bytes_written',
+                    len(json.dumps(metadata, default=str)),
+                )
+            else:
+                self.metrics.increment('catalog.paths_unchanged')
+
+    def _remove_deleted(self):
         """
-        Returns a list of paths that bread-crumb from the filter all the way
-        back to root. For example:
-
-            filters=[
-                '/schemas/my_db/tables/foo*'
-            ]
-            returns=[
-                '/schemas',
-                '/schemas/my_db',
-                '/schemas/my_db/tables',
-                '/schemas/my_db/tables/foo*',
-            ]
-
-        We need to do this so that parents match the filter and crawling
-        reaches the wild-carded children.
+        Compares the children that the browser listed vs. what is currently
+        in the catalog. Deletes all children that appear in the catalog, but
+        no longer appear in the browser. This behavior removes children that
+        used to exist in data infrastructure, but have been deleted since the
+        last crawl.
+
+        All listings collected since the last call are reconciled with a
+        single catalog `prune` call. If it fails, the listings are kept for
+        the next call.
         """
 
-        exploded_filters = []
-        for filter in filters:
-            fragments = filter.split('/')
-            partial_path = PurePosixPath('/')
-            for fragment in fragments:
-                partial_path = PurePosixPath(partial_path, fragment)
-                exploded_filters.extend(str(partial_path))
-        return exploded_filters
+        with self.listings_lock:
+            listings = self.listings
+            self.listings = {}
+        if listings:
+            log.debug(
+                'Removing deleted children from catalog for paths=%s',
+                len(listings),
+            )
+            try:
+                with self.metrics.timer('catalog.prune'):
+                    self.catalog.prune({
+                        PurePosixPath(self.root, str(path)[1:]): children
+                        for path, children in listings.items()
+                    })
+            except:
+                with self.listings_lock:
+                    # Listings collected since then are newer.
+                    self.listings = listings | self.listings
+                raise
 
     @staticmethod
     @contextmanager
@@ -198,6 +590,11 @@ class Crawler:
         url = config.get('url')
         excludes = config.get('excludes', [])
         filters = config.get('filters', [])
+        workers = config.get('workers', 1)
+        incremental = config.get('incremental', False)
+        checkpoint_interval = config.get('checkpoint_interval', 60)
+        resume = config.get('resume', False)
+        analyzer_workers = config.get('analyzer_workers', 1)
 
         assert url, \
             f"No url defined for instance config={config}"
@@ -206,6 +603,9 @@ class Crawler:
         browser = None
 
         with ExitStack() as stack:
+            # Let the browser and analyzers share database connection pools.
+            stack.enter_context(shared_engines())
+
             for analyzer_name, analyzer_cls in analyzer_plugins.items():
                 if (analyzer_name not in excludes):
                     try:
@@ -238,6 +638,12 @@ class Crawler:
             assert browser, f"Found no browser for url={url}"
 
             root = browser.root(**config)
+            root_hash = hashlib.sha1(str(root).encode()).hexdigest()
+            checkpoint_path = Path(
+                settings('root_path', RECAP_HOME),
+                'checkpoints',
+                f"{root_hash}.json",
+            )
 
             yield Crawler(
                 root,
@@ -245,4 +651,10 @@ class Crawler:
                 catalog,
                 analyzers,
                 filters,
+                workers,
+                incremental,
+                checkpoint_path,
+                checkpoint_interval,
+                resume,
+                analyzer_workers,
             )
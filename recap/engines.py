@@ -0,0 +1,88 @@
+import logging
+import sqlalchemy as sa
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Generator, TypeVar
+
+
+log = logging.getLogger(__name__)
+
+
+_engines: ContextVar[dict[Any, sa.engine.Engine] | None] = ContextVar(
+    'recap_engines',
+    default=None,
+)
+_engines_lock = threading.Lock()
+
+# Engine attribute that holds `engine_state`.
+_STATE_ATTRIBUTE = '_recap_state'
+# Reentrant, since state factories can request other state.
+_state_lock = threading.RLock()
+
+T = TypeVar('T')
+
+
+@contextmanager
+def shared_engines() -> Generator[dict[Any, sa.engine.Engine], None, None]:
+    """
+    Shares SQLAlchemy engines within a `with` block. Inside the block,
+    `create_engine` returns the same engine (and connection pool) for the
+    same URL and engine options, rather than creating a new one every time.
+    All engines are disposed, and their `engine_state` dropped, when the
+    block exits.
+
+    The crawler opens a shared engine block around each crawl, so its browser
+    and all of its analyzers use one connection pool.
+    """
+
+    engines = {}
+    token = _engines.set(engines)
+    try:
+        yield engines
+    finally:
+        _engines.reset(token)
+        for engine in engines.values():
+            engine.dispose()
+            with _state_lock:
+                engine.__dict__.pop(_STATE_ATTRIBUTE, None)
+
+
+def create_engine(url: str, **engine_options) -> sa.engine.Engine:
+    """
+    Creates a SQLAlchemy engine, or returns the shared engine for the URL and
+    engine options if called inside a `shared_engines` block.
+
+    :param engine_options: Forwarded to `sqlalchemy.create_engine`. For
+        example, `pool_size` and `max_overflow`.
+    """
+
+    engines = _engines.get()
+    if engines is None:
+        return sa.create_engine(url, **engine_options)
+    # Options can contain dicts (e.g. connect_args), so they aren't hashable.
+    key = (url, repr(sorted(engine_options.items())))
+    with _engines_lock:
+        if key not in engines:
+            log.debug('Creating shared engine for url=%s', url)
+            engines[key] = sa.create_engine(url, **engine_options)
+        return engines[key]
+
+
+def engine_state(
+    engine: sa.engine.Engine,
+    name: str,
+    factory: Callable[[], T],
+) -> T:
+    """
+    Returns state, like a reflection cache, that's shared by everything that
+    uses an engine. The state is created with `factory` the first time it's
+    requested. It's stored on the engine rather than in a global registry,
+    so it's freed along with the engine.
+    """
+
+    with _state_lock:
+        state = engine.__dict__.setdefault(_STATE_ATTRIBUTE, {})
+        if name not in state:
+            state[name] = factory()
+        return state[name]
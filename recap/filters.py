@@ -0,0 +1,149 @@
+import fnmatch
+import re
+from pathlib import PurePosixPath
+from typing import List
+
+
+# Pattern tokens. Literal characters are stored as plain strings and bracket
+# expressions as compiled regexes.
+_ANY = object()
+_STAR = object()
+
+
+class PathFilter:
+    """
+    Matches paths against Unix shell-style wildcards, as defined in Python's
+    fnmatch module. All patterns are compiled once, when the filter is
+    created.
+
+    PathFilter answers two questions:
+
+    1. Does a path match any pattern?
+    2. Could any of a path's descendants match a pattern?
+
+    The first question is answered with a single regex that combines all
+    patterns. The second is answered by running the path (with a trailing
+    slash) through a small NFA built from each pattern's tokens. If some
+    pattern still has a live state after the whole path is consumed, a
+    descendant might match, so the path's children need to be browsed. If
+    not, the whole subtree can be pruned.
+
+    Like fnmatch, `*` matches any characters, including `/`. A pattern that
+    starts with `/**/` can therefore match anywhere, and won't prune
+    anything. Patterns that spell out leading segments, like
+    `/schemas/public/tables/foo*`, prune everything outside of
+    `/schemas/public/tables`.
+    """
+
+    def __init__(self, patterns: List[str] = []):
+        self.patterns = list(patterns)
+        self.regex = re.compile('|'.join(
+            fnmatch.translate(pattern)
+            for pattern in self.patterns
+        )) if self.patterns else None
+        self.tokens = [self._tokenize(pattern) for pattern in self.patterns]
+
+    def matches(self, path: PurePosixPath) -> bool:
+        """
+        :returns: True if the path matches a pattern or if there are no
+            patterns.
+        """
+
+        if not self.regex:
+            return True
+        return self.regex.match(str(path)) is not None
+
+    def may_match_descendant(self, path: PurePosixPath) -> bool:
+        """
+        :returns: True if any of the path's descendants might match a pattern
+            or if there are no patterns. False means no descendant can match.
+        """
+
+        if not self.patterns:
+            return True
+        prefix = str(path)
+        if not prefix.endswith('/'):
+            prefix += '/'
+        for tokens in self.tokens:
+            states = self._closure(tokens, {0})
+            for char in prefix:
+                states = self._step(tokens, states, char)
+                if not states:
+                    break
+            if states:
+                return True
+        return False
+
+    @staticmethod
+    def _tokenize(pattern: str) -> List[object]:
+        """
+        Splits a pattern into tokens using the same rules as
+        `fnmatch.translate`.
+        """
+
+        tokens = []
+        i, n = 0, len(pattern)
+        while i < n:
+            char = pattern[i]
+            i += 1
+            if char == '*':
+                # Consecutive stars are equivalent to a single star.
+                if not tokens or tokens[-1] is not _STAR:
+                    tokens.append(_STAR)
+            elif char == '?':
+                tokens.append(_ANY)
+            elif char == '[':
+                j = i
+                if j < n and pattern[j] == '!':
+                    j += 1
+                if j < n and pattern[j] == ']':
+                    j += 1
+                while j < n and pattern[j] != ']':
+                    j += 1
+                if j >= n:
+                    # No closing bracket, so '[' is a literal.
+                    tokens.append(char)
+                else:
+                    bracket = pattern[i - 1:j + 1]
+                    tokens.append(re.compile(fnmatch.translate(bracket)))
+                    i = j + 1
+            else:
+                tokens.append(char)
+        return tokens
+
+    @staticmethod
+    def _closure(tokens: List[object], states: set[int]) -> set[int]:
+        """
+        Adds states that are reachable without consuming a character. A star
+        can always match nothing, so it's skipped.
+        """
+
+        closed = set(states)
+        for state in states:
+            while state < len(tokens) and tokens[state] is _STAR:
+                state += 1
+                closed.add(state)
+        return closed
+
+    @staticmethod
+    def _step(
+        tokens: List[object],
+        states: set[int],
+        char: str,
+    ) -> set[int]:
+        """
+        :returns: The states reachable from `states` by consuming `char`.
+        """
+
+        next_states = set()
+        for state in states:
+            if state == len(tokens):
+                continue
+            token = tokens[state]
+            if token is _STAR:
+                next_states.add(state)
+            elif token is _ANY \
+                or token == char \
+                or (isinstance(token, re.Pattern) and token.match(char)):
+                next_states.add(state + 1)
+        return PathFilter._closure(tokens, next_states)
@@ -0,0 +1,97 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Generator, List
+
+
+class CrawlMetrics:
+    """
+    Collects timings and counters for a crawl. CrawlMetrics is thread-safe,
+    so it can be shared by all of a crawler's workers.
+
+    Timings are kept as histograms (every sample is stored), keyed by a name
+    like `analyzer.TableColumnAnalyzer` or `catalog.write_many`. Counters are
+    simple sums, keyed the same way. The slowest paths are tracked
+    separately, so the report can show where crawl time went.
+    """
+
+    def __init__(self, slowest_paths: int = 10):
+        """
+        :param slowest_paths: Number of slowest paths to keep for the report.
+        """
+
+        self.timings: dict[str, List[float]] = defaultdict(list)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.slowest_paths_size = slowest_paths
+        # Min-heap of (seconds, path), so the fastest path is popped first.
+        self.slowest_paths: List[tuple[float, str]] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, name: str) -> Generator[None, None, None]:
+        """
+        Times the body of a `with` block and records it under `name`.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.timings[name].append(seconds)
+
+    def increment(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_path(self, path: str, seconds: float):
+        """
+        Records how long a path took to crawl.
+        """
+
+        with self.lock:
+            heapq.heappush(self.slowest_paths, (seconds, path))
+            if len(self.slowest_paths) > self.slowest_paths_size:
+                heapq.heappop(self.slowest_paths)
+
+    def report(self) -> dict[str, Any]:
+        """
+        :returns: A JSON-serializable report with a summary of each timing
+            histogram (count, total, mean, p50, p95, and max seconds), all
+            counters, and the slowest paths (slowest first).
+        """
+
+        with self.lock:
+            timings = {
+                name: self._summarize(samples)
+                for name, samples in sorted(self.timings.items())
+            }
+            counters = dict(sorted(self.counters.items()))
+            slowest_paths = [
+                {'path': path, 'seconds': seconds}
+                for seconds, path in sorted(self.slowest_paths, reverse=True)
+            ]
+        return {
+            'timings': timings,
+            'counters': counters,
+            'slowest_paths': slowest_paths,
+        }
+
+    @staticmethod
+    def _summarize(samples: List[float]) -> dict[str, Any]:
+        samples = sorted(samples)
+        count = len(samples)
+        total = sum(samples)
+        return {
+            'count': count,
+            'total': total,
+            'mean': total / count,
+            'p50': samples[int(0.50 * (count - 1))],
+            'p95': samples[int(0.95 * (count - 1))],
+            'max': samples[-1],
+        }
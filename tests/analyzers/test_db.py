@@ -0,0 +1,95 @@
+from pathlib import PurePosixPath
+from recap.analyzers.db import TableProfileAnalyzer
+from sqlalchemy import create_engine
+from sqlalchemy.sql import text
+
+
+# Analyzers get paths relative to the instance's root.
+PATH = PurePosixPath('/schemas/main/tables/events')
+
+
+def test_incremental_profile_keeps_watermark_on_errors(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER, value INTEGER)"))
+        conn.execute(text("INSERT INTO events VALUES (1, 10), (2, 20)"))
+    analyzer = TableProfileAnalyzer(
+        engine,
+        watermark_columns={'main.events': 'id'},
+        chunk_columns=1,
+    )
+
+    previous = analyzer.analyze_with(PATH, {}, {})
+    assert previous['profile']['value']['count'] == 2
+    assert previous['profile_state']['watermark'] == 2
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO events VALUES (3, 30), (4, 40)"))
+
+    # Fail the `value` column's query.
+    query_columns = analyzer._query_columns
+
+    def failing_query_columns(from_clause, column_names, column_aggregates):
+        if 'value' in column_names:
+            raise RuntimeError('Query timed out')
+        return query_columns(from_clause, column_names, column_aggregates)
+
+    analyzer._query_columns = failing_query_columns
+    assert analyzer.analyze_with(PATH, {}, previous) == {}
+
+    # The rows past the old watermark are profiled once the error clears.
+    analyzer._query_columns = query_columns
+    results = analyzer.analyze_with(PATH, {}, previous)
+    assert results['profile']['value']['count'] == 4
+    assert results['profile']['value']['max'] == 40
+    assert results['profile_state']['watermark'] == 4
+
+
+def test_views_are_sampled_with_a_row_limit(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER)"))
+        conn.execute(text("INSERT INTO events VALUES (1), (2), (3), (4)"))
+        conn.execute(text("CREATE VIEW recent AS SELECT * FROM events"))
+    # Pretend SQLite supports TABLESAMPLE, which it would reject.
+    monkeypatch.setattr(
+        TableProfileAnalyzer,
+        'TABLESAMPLE_METHODS',
+        {'sqlite': ['SYSTEM']},
+    )
+    analyzer = TableProfileAnalyzer(engine, sample_percent=50, sample_rows=2)
+
+    results = analyzer.analyze_with(
+        PurePosixPath('/schemas/main/views/recent'),
+        {},
+        {},
+    )
+
+    assert 'error' not in results['profile']['id']
+    assert results['profile']['id']['count'] == 2
+    assert results['profile']['id']['sampled']
+
+
+def test_timed_out_chunks_are_not_bisected(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (a INTEGER, b INTEGER)"))
+        conn.execute(text(
+            "WITH RECURSIVE n(i) AS "
+            "(SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10000) "
+            "INSERT INTO events SELECT i, i FROM n"
+        ))
+    # Every query runs past the deadline.
+    analyzer = TableProfileAnalyzer(engine, query_timeout=1e-9)
+    queries = []
+    query_columns = analyzer._query_columns
+
+    def counting_query_columns(from_clause, column_names, column_aggregates):
+        queries.append(column_names)
+        return query_columns(from_clause, column_names, column_aggregates)
+
+    analyzer._query_columns = counting_query_columns
+    results = analyzer.analyze_with(PATH, {}, {})
+
+    assert queries == [['a', 'b']]
+    assert all('error' in stats for stats in results['profile'].values())
@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from recap.browsers import db
+from recap.browsers.db import BoundedCache, DatabaseBrowser, MISSING
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from sqlalchemy.sql import text
+
+
+PATH = PurePosixPath('/schemas/main/tables/events')
+
+
+def _browser(tmp_path, monkeypatch, last_change_query):
+    engine = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER)"))
+    monkeypatch.setattr(db, 'LAST_CHANGE_QUERIES', {
+        'sqlite': last_change_query,
+    })
+    return DatabaseBrowser(engine)
+
+
+def test_fingerprints_data_with_last_change(tmp_path, monkeypatch):
+    browser = _browser(
+        tmp_path,
+        monkeypatch,
+        "SELECT count(*) FROM events "
+        "WHERE :schema IS NOT NULL AND :table IS NOT NULL",
+    )
+
+    fingerprint = browser.fingerprint(PATH)
+    assert browser.fingerprints_data(PATH)
+    with browser.engine.begin() as conn:
+        conn.execute(text("INSERT INTO events VALUES (1)"))
+    assert browser.fingerprint(PATH) != fingerprint
+
+
+def test_fingerprints_data_without_last_change(tmp_path, monkeypatch):
+    browser = _browser(
+        tmp_path,
+        monkeypatch,
+        "SELECT count(*) FROM missing "
+        "WHERE :schema IS NOT NULL AND :table IS NOT NULL",
+    )
+
+    assert browser.fingerprint(PATH)
+    assert not browser.fingerprints_data(PATH)
+
+
+def test_bounded_cache_loads_each_key_once():
+    cache = BoundedCache(2)
+    loads = []
+    loading = threading.Event()
+
+    def load():
+        loads.append(1)
+        loading.wait(1)
+        return None
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(cache.get_or_load, 'a', load)
+            for _ in range(4)
+        ]
+        loading.set()
+        assert [future.result() for future in futures] == [None] * 4
+
+    assert len(loads) == 1
+    # None is cached, too.
+    assert cache.get('a', MISSING) is None
+    # Locks aren't kept once a key is loaded.
+    assert cache.loading == {}
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = BoundedCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+
+    assert cache.get('b', MISSING) is MISSING
+    assert cache.get_or_load('b', lambda: 4) == 4
+    assert list(cache.keys()) == ['c', 'b']
+
+
+def test_postgresql_column_helpers_are_checked(monkeypatch):
+    dialect = PGDialect()
+    assert db._has_postgresql_column_helpers(dialect)
+
+    def _get_column_info(
+        name, format_type, default, notnull, domains, enums, schema,
+        comment, generated, identity, collation,
+    ):
+        pass
+
+    monkeypatch.setattr(dialect, '_get_column_info', _get_column_info)
+    assert not db._has_postgresql_column_helpers(dialect)
+    monkeypatch.undo()
+    monkeypatch.delattr(PGDialect, '_load_enums')
+    assert not db._has_postgresql_column_helpers(dialect)
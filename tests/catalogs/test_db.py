@@ -0,0 +1,281 @@
+import pytest
+from datetime import datetime
+from pathlib import PurePosixPath
+from recap.catalogs import db
+from recap.catalogs.db import DatabaseCatalog
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import text
+
+
+def test_upgrade_adds_missing_indexes(tmp_path):
+    # The catalog schema before catalog_current had full paths.
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE catalog ("
+            "id INTEGER PRIMARY KEY, "
+            "parent VARCHAR(65535) NOT NULL, "
+            "name VARCHAR(4096) NOT NULL, "
+            "metadata JSON NOT NULL, "
+            "created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "deleted_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX parent_name_idx ON catalog (parent, name)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE catalog_current ("
+            "parent VARCHAR(65535) NOT NULL, "
+            "name VARCHAR(4096) NOT NULL, "
+            "entry_id INTEGER NOT NULL, "
+            "metadata JSON NOT NULL, "
+            "created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "PRIMARY KEY (parent, name))"
+        ))
+        conn.execute(text(
+            "INSERT INTO catalog (id, parent, name, metadata) VALUES "
+            "(1, '/', 'a', '{}'), "
+            "(2, '/a', 'b', '{\"columns\": {\"id\": 1}}')"
+        ))
+        conn.execute(text(
+            "INSERT INTO catalog_current (parent, name, entry_id, metadata) "
+            "VALUES ('/', 'a', 1, '{}'), "
+            "('/a', 'b', 2, '{\"columns\": {\"id\": 1}}')"
+        ))
+
+    catalog = DatabaseCatalog(engine)
+
+    indexes = {
+        index['name']: index['column_names']
+        for index in inspect(engine).get_indexes('catalog_current')
+    }
+    assert indexes['current_path_idx'] == ['path']
+    assert catalog.count(PurePosixPath('/a')) == 1
+    assert catalog.descendants(PurePosixPath('/')) == [
+        PurePosixPath('/a'),
+        PurePosixPath('/a/b'),
+    ]
+
+
+def test_concurrent_writers_create_the_same_path(tmp_path):
+    url = f"sqlite:///{tmp_path / 'recap.db'}"
+    catalog = DatabaseCatalog(create_engine(url))
+    # Another process, writing to the same catalog.
+    other = DatabaseCatalog(create_engine(url))
+    catalog.touch(PurePosixPath('/a'))
+    get_current = catalog._get_current
+
+    def racing_get_current(session, path, for_update=False):
+        # The other writer creates the path after this one has seen that it
+        # doesn't exist, but before this one commits.
+        if not other.read(path):
+            other.write(path, 'columns', {'id': 1})
+            return None
+        return get_current(session, path, for_update)
+
+    catalog._get_current = racing_get_current
+    catalog.write_many(PurePosixPath('/a/b'), {'profile': {'count': 1}})
+    catalog._get_current = get_current
+
+    assert catalog.read(PurePosixPath('/a/b')) == {
+        'columns': {'id': 1},
+        'profile': {'count': 1},
+    }
+    assert catalog.ls(PurePosixPath('/a')) == ['b']
+
+
+def test_search_as_of(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    catalog = DatabaseCatalog(engine)
+    for name in ['unchanged', 'changed', 'deleted']:
+        catalog.write_many(
+            PurePosixPath('/a', name),
+            {'columns': {'id': 1}, 'comment': name},
+        )
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE catalog SET created_at = '2020-01-01 00:00:00'"
+        ))
+        # Written before payloads existed.
+        conn.execute(text(
+            "INSERT INTO catalog (parent, name, metadata, created_at) "
+            "VALUES ('/a', 'legacy', "
+            "'{\"columns\": {\"id\": 1}, \"comment\": \"legacy\"}', "
+            "'2020-01-01 00:00:00')"
+        ))
+    catalog.write(PurePosixPath('/a/legacy'), 'columns', {'id': 2})
+    catalog.write(PurePosixPath('/a/changed'), 'columns', {'id': 2})
+    catalog.rm(PurePosixPath('/a/deleted'))
+    catalog.write(PurePosixPath('/a/new'), 'columns', {'id': 1})
+    as_of = datetime(2021, 1, 1)
+    query = "json_extract(metadata, '$.columns.id') = 1"
+
+    results = catalog.search(query, as_of)
+
+    assert sorted(doc['comment'] for doc in results) == [
+        'changed',
+        'deleted',
+        'legacy',
+        'unchanged',
+    ]
+    assert len(catalog.search(query)) == 2
+
+
+def test_failed_search_as_of_drops_its_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    catalog = DatabaseCatalog(engine)
+    catalog.write(PurePosixPath('/a/b'), 'columns', {'id': 1})
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE catalog SET created_at = '2020-01-01 00:00:00'"
+        ))
+    catalog.write(PurePosixPath('/a/b'), 'columns', {'id': 2})
+    as_of = datetime(2021, 1, 1)
+
+    # Only the reconstructed documents' table doesn't have created_at.
+    with pytest.raises(OperationalError):
+        catalog.search('created_at IS NOT NULL', as_of)
+
+    query = "json_extract(metadata, '$.columns') IS NOT NULL"
+    assert catalog.search(query, as_of) == [
+        {'columns': {'id': 1}},
+    ]
+
+
+def test_prune_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'BATCH_SIZE', 3)
+    catalog = DatabaseCatalog(create_engine(
+        f"sqlite:///{tmp_path / 'recap.db'}",
+    ))
+    for parent in range(7):
+        for child in ['kept', 'deleted']:
+            catalog.write(
+                PurePosixPath(f"/p{parent}/{child}/c"),
+                'columns',
+                {'id': 1},
+            )
+
+    catalog.prune({
+        PurePosixPath(f"/p{parent}"): ['kept']
+        # /p6 wasn't listed, so none of its children are pruned.
+        for parent in range(6)
+    })
+
+    for parent in range(6):
+        assert catalog.ls(PurePosixPath(f"/p{parent}")) == ['kept']
+        assert catalog.ls(PurePosixPath(f"/p{parent}/kept")) == ['c']
+        assert catalog.read(PurePosixPath(f"/p{parent}/deleted/c")) is None
+    assert sorted(catalog.ls(PurePosixPath('/p6'))) == ['deleted', 'kept']
+    assert catalog.count(PurePosixPath('/')) == 6 * 3 + 5
+
+
+def test_compact_keep_versions_reuses_payloads(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    catalog = DatabaseCatalog(engine)
+    path = PurePosixPath('/a/b')
+    catalog.write_many(path, {'columns': {'id': 1}, 'comment': 'kept'})
+    catalog.write(path, 'columns', {'id': 2})
+    catalog.write(path, 'columns', {'id': 3})
+
+    assert catalog.compact(keep_versions=1) == 2
+
+    # The comment's payload is shared by every version, so it's still used.
+    assert catalog.read(path) == {'columns': {'id': 3}, 'comment': 'kept'}
+    with engine.connect() as conn:
+        payloads = conn.execute(text(
+            "SELECT type, payload FROM catalog_payloads ORDER BY type"
+        )).fetchall()
+    assert payloads == [('columns', '{"id": 3}'), ('comment', '"kept"')]
+
+
+def test_compact_keep_days(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    catalog = DatabaseCatalog(engine)
+    path = PurePosixPath('/a/b')
+    catalog.write(path, 'columns', {'id': 1})
+    catalog.write(path, 'columns', {'id': 2})
+    catalog.write(PurePosixPath('/a/deleted'), 'columns', {'id': 1})
+    catalog.rm(PurePosixPath('/a/deleted'))
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE catalog SET created_at = '2020-01-01 00:00:00', "
+            "deleted_at = CASE WHEN deleted_at IS NULL THEN NULL "
+            "ELSE '2020-01-02 00:00:00' END"
+        ))
+        conn.execute(text(
+            "UPDATE catalog SET created_at = '2020-06-01 00:00:00' "
+            "WHERE id = (SELECT MAX(id) FROM catalog WHERE name = 'b')"
+        ))
+    catalog.write(path, 'columns', {'id': 3})
+
+    # Versions are only removed if both limits allow it, and /a/deleted was
+    # deleted before the cutoff.
+    assert catalog.compact(keep_days=1, keep_versions=3) == 1
+    assert catalog.read(path, datetime(2020, 2, 1)) == {'columns': {'id': 1}}
+
+    assert catalog.compact(keep_days=1) == 1
+
+    # The version that was current a day ago is kept for as_of reads.
+    assert catalog.read(path, datetime(2020, 7, 1)) == {'columns': {'id': 2}}
+    assert catalog.read(path, datetime(2020, 2, 1)) is None
+    assert catalog.read(path) == {'columns': {'id': 3}}
+    assert catalog.compact(keep_days=1) == 0
+
+
+def test_write_many_skips_unchanged_types(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recap.db'}")
+    catalog = DatabaseCatalog(engine)
+    path = PurePosixPath('/a/b')
+    assert catalog.write_many(path, {'columns': {'id': 1}, 'comment': 'x'})
+    loads = []
+    get_current = catalog._get_current
+
+    def counting_get_current(session, path, for_update=False):
+        loads.append(path)
+        return get_current(session, path, for_update)
+
+    catalog._get_current = counting_get_current
+
+    # Matching hashes don't need the current document.
+    assert not catalog.write_many(path, {'columns': {'id': 1}})
+    assert not catalog.write_many(path, {'comment': 'x'})
+    assert loads == []
+    assert catalog.write_many(path, {'comment': 'y'})
+    assert loads == [path]
+
+    # Written before hashes existed, so the documents are compared instead,
+    # and the hashes are filled in.
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE catalog_current SET hashes = NULL"))
+    assert not catalog.write_many(path, {'comment': 'y'})
+    assert not catalog.write_many(path, {'comment': 'y'})
+    assert loads == [path, path]
+    with engine.connect() as conn:
+        versions = conn.execute(text(
+            "SELECT COUNT(*) FROM catalog WHERE name = 'b'"
+        )).scalar()
+    assert versions == 2
+    assert catalog.read(path) == {'columns': {'id': 1}, 'comment': 'y'}
+
+
+def test_subtree_excludes_siblings_with_similar_names(tmp_path):
+    catalog = DatabaseCatalog(create_engine(
+        f"sqlite:///{tmp_path / 'recap.db'}",
+    ))
+    # Characters just before and after '/', and LIKE wildcards.
+    siblings = ['b-c', 'b.c', 'b0', 'b_c', 'b%', 'bc']
+    for name in ['b/c/d'] + siblings:
+        catalog.touch(PurePosixPath('/a', name))
+
+    assert catalog.descendants(PurePosixPath('/a/b')) == [
+        PurePosixPath('/a/b/c'),
+        PurePosixPath('/a/b/c/d'),
+    ]
+    assert catalog.count(PurePosixPath('/a/b')) == 2
+    assert catalog.count(PurePosixPath('/')) == 10
+
+    catalog.rm(PurePosixPath('/a/b'))
+
+    assert sorted(catalog.ls(PurePosixPath('/a'))) == sorted(siblings)
+    assert catalog.count(PurePosixPath('/')) == 7
@@ -0,0 +1,52 @@
+import httpx
+import json
+from pathlib import PurePosixPath
+from recap.catalogs.recap import RecapCatalog
+
+
+def test_write_many_falls_back_to_write_on_older_servers():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((
+            request.method,
+            request.url.path,
+            request.url.params.get('type'),
+            json.loads(request.content) if request.content else None,
+        ))
+        # Older servers return nothing from PUT.
+        return httpx.Response(200, content=b'null')
+
+    client = httpx.Client(
+        base_url='http://recap',
+        transport=httpx.MockTransport(handler),
+    )
+    catalog = RecapCatalog(client)
+
+    path = PurePosixPath('/a/b')
+    assert catalog.write_many(path, {'columns': {'id': 1}, 'comment': 'x'})
+    assert requests == [
+        ('PUT', '/a/b', None, {'columns': {'id': 1}, 'comment': 'x'}),
+        ('PUT', '/a/b', 'columns', {'id': 1}),
+        ('PUT', '/a/b', 'comment', 'x'),
+    ]
+
+    # The server's support is only checked once.
+    requests.clear()
+    assert catalog.write_many(path, {'columns': {'id': 2}})
+    assert requests == [('PUT', '/a/b', 'columns', {'id': 2})]
+
+
+def test_write_many_returns_whether_newer_servers_wrote():
+    written = iter([True, False])
+    client = httpx.Client(
+        base_url='http://recap',
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json=next(written)),
+        ),
+    )
+    catalog = RecapCatalog(client)
+
+    path = PurePosixPath('/a/b')
+    assert catalog.write_many(path, {'columns': {'id': 1}}) is True
+    assert catalog.write_many(path, {'columns': {'id': 1}}) is False
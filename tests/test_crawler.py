@@ -0,0 +1,146 @@
+import json
+import pytest
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from recap.analyzers.abstract import AbstractAnalyzer
+from recap.browsers.abstract import AbstractBrowser
+from recap.catalogs.db import DatabaseCatalog
+from recap.crawler import Crawler
+from sqlalchemy import create_engine
+from typing import Any, Generator, Iterable
+
+
+ROOT = PurePosixPath('/databases/test')
+
+
+class StaticBrowser(AbstractBrowser):
+    def __init__(self, listings: dict[str, list[str]]):
+        self.listings = listings
+
+    def children(self, path: PurePosixPath) -> Iterable[str]:
+        return self.listings.get(str(path), [])
+
+    @staticmethod
+    def root(**config) -> PurePosixPath:
+        return ROOT
+
+    @staticmethod
+    @contextmanager
+    def open(**config) -> Generator['StaticBrowser', None, None]:
+        yield StaticBrowser({})
+
+
+class PathAnalyzer(AbstractAnalyzer):
+    produces = ['path']
+
+    def __init__(self, failing: set[str] = set()):
+        self.failing = failing
+        self.analyzed: list[str] = []
+
+    def analyze(self, path: PurePosixPath) -> dict[str, Any]:
+        self.analyzed.append(str(path))
+        if str(path) in self.failing:
+            raise RuntimeError(f"Unable to analyze {path}")
+        return {'path': str(path)}
+
+    @staticmethod
+    @contextmanager
+    def open(**config) -> Generator['PathAnalyzer', None, None]:
+        yield PathAnalyzer()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DatabaseCatalog(create_engine(f"sqlite:///{tmp_path / 'recap.db'}"))
+
+
+def test_resume_prunes_children_of_unpruned_paths(
+    tmp_path,
+    catalog,
+    monkeypatch,
+):
+    # Deleted from the database since the last crawl.
+    catalog.touch(PurePosixPath(ROOT, 'a', 'deleted'))
+    browser = StaticBrowser({'/': ['a'], '/a': ['b']})
+    checkpoint_path = tmp_path / 'checkpoint.json'
+
+    def failing_prune(children):
+        raise RuntimeError('Unable to prune')
+
+    monkeypatch.setattr(catalog, 'prune', failing_prune)
+    crawler = Crawler(
+        ROOT,
+        browser,
+        catalog,
+        [PathAnalyzer({'/a/b'})],
+        checkpoint_path=checkpoint_path,
+        checkpoint_interval=3600,
+    )
+    with pytest.raises(RuntimeError, match='Unable to analyze'):
+        crawler.crawl()
+
+    # /a was crawled, but its deleted child wasn't removed.
+    checkpoint = json.loads(checkpoint_path.read_text())
+    assert '/a' in checkpoint['frontier']
+    assert '/a' not in checkpoint['completed']
+
+    monkeypatch.undo()
+    Crawler(
+        ROOT,
+        browser,
+        catalog,
+        [PathAnalyzer()],
+        checkpoint_path=checkpoint_path,
+        resume=True,
+    ).crawl()
+
+    assert catalog.ls(PurePosixPath(ROOT, 'a')) == ['b']
+    assert not checkpoint_path.exists()
+
+
+def test_resume_skips_completed_paths(tmp_path, catalog):
+    browser = StaticBrowser({'/': ['a', 'b'], '/a': ['x'], '/b': ['y']})
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    with pytest.raises(RuntimeError, match='Unable to analyze'):
+        Crawler(
+            ROOT,
+            browser,
+            catalog,
+            [PathAnalyzer({'/b'})],
+            checkpoint_path=checkpoint_path,
+        ).crawl()
+    checkpoint = json.loads(checkpoint_path.read_text())
+    assert '/a' in checkpoint['completed']
+    assert '/b' in checkpoint['frontier']
+
+    # Checkpoints from a crawl with different filters are ignored.
+    other_checkpoint_path = tmp_path / 'other.json'
+    other_checkpoint_path.write_text(checkpoint_path.read_text())
+    analyzer = PathAnalyzer()
+    Crawler(
+        ROOT,
+        browser,
+        catalog,
+        [analyzer],
+        filters=['/a*'],
+        checkpoint_path=other_checkpoint_path,
+        resume=True,
+    ).crawl()
+    assert '/a' in analyzer.analyzed
+
+    analyzer = PathAnalyzer()
+    Crawler(
+        ROOT,
+        browser,
+        catalog,
+        [analyzer],
+        checkpoint_path=checkpoint_path,
+        resume=True,
+    ).crawl()
+
+    checkpoint_completed = set(checkpoint['completed'])
+    assert '/b' in analyzer.analyzed
+    assert not checkpoint_completed & set(analyzer.analyzed)
+    for path in ['/a', '/a/x', '/b', '/b/y']:
+        assert catalog.read(PurePosixPath(ROOT, path[1:])) == {'path': path}
+    assert not checkpoint_path.exists()
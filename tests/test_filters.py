@@ -0,0 +1,58 @@
+import pytest
+from pathlib import PurePosixPath
+from recap.filters import PathFilter
+
+
+@pytest.mark.parametrize('patterns,path,expected', [
+    ([], '/databases', True),
+    (['/schemas/public/tables/foo*'], '/', True),
+    (['/schemas/public/tables/foo*'], '/schemas', True),
+    (['/schemas/public/tables/foo*'], '/schemas/public/tables', True),
+    (['/schemas/public/tables/foo*'], '/schemas/private', False),
+    (['/schemas/public/tables/foo*'], '/schemas/public/views', False),
+    # The star can match the rest of the name and a slash.
+    (['/schemas/public/tables/foo*'], '/schemas/public/tables/foo', True),
+    (['/schemas/public/tables/foo*'], '/schemas/public/tables/bar', False),
+    (['/schemas/p?blic/tables'], '/schemas/pUblic', True),
+    (['/schemas/p?blic/tables'], '/schemas/pblic', False),
+    (['/schemas/[!p]*/tables'], '/schemas/public', False),
+    (['/schemas/[!p]*/tables'], '/schemas/sales', True),
+    (['/schemas/[a-c]x'], '/schemas/[a-c]x', False),
+    # An unclosed bracket is a literal.
+    (['/schemas/[abc/tables'], '/schemas/[abc', True),
+    (['/schemas/[abc/tables'], '/schemas/a', False),
+    # Stars match across slashes, like fnmatch.
+    (['/**/tables/foo'], '/schemas/public/views', True),
+    (['/schemas/*/tables/foo'], '/schemas/a/b/c', True),
+    (['/schemas/public/tables/foo'], '/schemas/public/tables/foo', False),
+    (['/schemas/a/*', '/schemas/b/*'], '/schemas/b', True),
+    (['/schemas/a/*', '/schemas/b/*'], '/schemas/c', False),
+])
+def test_may_match_descendant(patterns, path, expected):
+    assert PathFilter(patterns).may_match_descendant(
+        PurePosixPath(path),
+    ) == expected
+
+
+@pytest.mark.parametrize('pattern', [
+    '/schemas/public/tables/foo*',
+    '/schemas/p?blic/*',
+    '/schemas/[!p]*/tables/[a-c]?',
+    '/**/tables/*',
+    '/schemas/[abc/tables',
+])
+def test_may_match_descendant_agrees_with_matches(pattern):
+    # No path is pruned if one of its descendants matches.
+    path_filter = PathFilter([pattern])
+    paths = [
+        '/schemas/public/tables/foo',
+        '/schemas/public/tables/foobar',
+        '/schemas/pUblic/views/x',
+        '/schemas/sales/tables/ab',
+        '/schemas/[abc/tables',
+        '/schemas/other/tables/z',
+    ]
+    for path in map(PurePosixPath, paths):
+        if path_filter.matches(path):
+            for ancestor in path.parents:
+                assert path_filter.may_match_descendant(ancestor)
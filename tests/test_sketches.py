@@ -0,0 +1,72 @@
+import pytest
+from decimal import Decimal
+
+np = pytest.importorskip('numpy')
+
+from recap.sketches import (
+    HyperLogLog,
+    MAX_VECTORIZED_LENGTH,
+    QuantileSketch,
+    as_floats,
+    hash_values,
+)
+
+
+def test_hash_values():
+    numeric = hash_values([1, 1.0, Decimal('1.0'), None, 0.0, -0.0], True)
+    assert len(numeric) == 5
+    assert len(set(numeric[:3])) == 1
+    assert numeric[3] == numeric[4]
+
+    long_value = 'x' * (MAX_VECTORIZED_LENGTH + 1)
+    values = ['a', b'a\x00', long_value, None, 'a']
+    hashes = hash_values(values)
+    # Each value hashes the same no matter what it's hashed with.
+    assert list(hashes) == [
+        hash_values([value])[0]
+        for value in values
+        if value is not None
+    ]
+    assert hashes[0] == hashes[3]
+    assert len(set(hashes[:3])) == 3
+
+
+def test_hyperloglog():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 1 << 40, 100000)
+    hashes = hash_values(values, numeric=True)
+    distinct = len(np.unique(values))
+    sketch = HyperLogLog()
+    sketch.update(hashes)
+    assert abs(sketch.estimate() - distinct) / distinct < 0.05
+
+    # Merging halves is the same as sketching everything at once.
+    merged = HyperLogLog()
+    merged.update(hashes[:50000])
+    other = HyperLogLog.from_dict(HyperLogLog().to_dict())
+    other.update(hashes[50000:])
+    merged.merge(HyperLogLog.from_dict(other.to_dict()))
+    assert (merged.registers == sketch.registers).all()
+
+    small = HyperLogLog()
+    small.update(hash_values(['a', 'b', 'c', 'a']))
+    assert small.estimate() == 3
+
+
+def test_quantile_sketch():
+    rng = np.random.default_rng(0)
+    values = as_floats(rng.normal(size=100000))
+    fractions = [0.01, 0.25, 0.5, 0.75, 0.99]
+    sketch = QuantileSketch()
+    other = QuantileSketch()
+    for chunk in np.array_split(values, 20):
+        sketch.update(chunk)
+        other.update(chunk)
+    sketch.merge(QuantileSketch.from_dict(other.to_dict()))
+
+    assert sketch.count() == 2 * len(values)
+    # Ranks are within 2% of the requested fractions.
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(fractions))
+    assert np.abs(ranks / len(values) - fractions).max() < 0.02
+    assert sum(map(len, sketch.levels)) < 3 * sketch.k
+    assert QuantileSketch().quantiles([0.5]) == [None]